@@ -0,0 +1,963 @@
+import concurrent.futures
+import contextlib
+import glob
+import hashlib
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import numpy
+from . import star_handler
+from . import spatial_index
+
+
+# Скомпилированный каталог - бинарный файл, содержащий заголовок и колонки данных о звёздах.
+# Заголовок: сигнатура формата, версия, количество звёзд и хэш исходных txt файлов.
+# Каждая колонка хранится непрерывным блоком (выровненным по 8 байт), что позволяет
+# отображать её в память (numpy.memmap) без разбора и копирования.
+# За колонками следует блок ошибок разбора: длина (uint32) и строки ошибок в UTF-8, разделённые переводом строки
+
+
+CATALOG_MAGIC = b'SKYCAT'
+CATALOG_VERSION = 2
+CATALOG_FILENAME = 'stars.cat'
+CAPS_FILENAME = 'caps.json'
+HEADER_FORMAT = '<6sHI20s'
+HEADER_SIZE = 64
+COLUMN_ALIGNMENT = 8
+LINES_BLOCK_SIZE = 16384
+# шаг эпохи (в годах), с которым пересчитываются положения звёзд с учётом собственного движения
+EPOCH_RESOLUTION = 0.01
+WHITESPACE = numpy.zeros(256, dtype=bool)
+WHITESPACE[list(b' \t\r\n\x0b\x0c')] = True
+UNDECODABLE = numpy.array([bytes([byte]).decode('cp1251', errors='replace') == '\ufffd' for byte in range(256)])
+CATALOG_COLUMNS = (
+    ('right_ascension', '<f8'),
+    ('declination', '<f8'),
+    ('apparent_magnitude', '<f8'),
+    ('stellar_class', 'S20'),
+    ('hd_number', '<i4'),
+    ('pm_ra', '<f4'),
+    ('pm_dec', '<f4'),
+)
+
+
+def get_source_files(path):
+    """
+    Получение отсортированного списка текстовых файлов каталога
+    :param path: Папка, содержащая звезды (*.txt)
+    :return: Список путей до файлов
+    """
+    return sorted(glob.glob(os.path.join(path, '*.txt')))
+
+
+def get_sources_signature(filenames):
+    """
+    Вычисление хэша исходных файлов по их именам, размерам и времени изменения
+    :param filenames: Список путей до файлов
+    :return: SHA-1 дайджест (20 байт)
+    """
+    digest = hashlib.sha1()
+    for filename in filenames:
+        stat = os.stat(filename)
+        digest.update('{}:{}:{};'.format(os.path.basename(filename), stat.st_size,
+                                         stat.st_mtime_ns).encode('utf-8'))
+    return digest.digest()
+
+
+def get_column_offsets(count):
+    """
+    Вычисление смещений колонок относительно начала файла каталога
+    :param count: Количество звёзд в каталоге
+    :return: Список кортежей (имя колонки, тип, смещение)
+    """
+    offsets = []
+    offset = HEADER_SIZE
+    for name, dtype in CATALOG_COLUMNS:
+        offsets.append((name, dtype, offset))
+        size = numpy.dtype(dtype).itemsize * count
+        offset += size + (-size) % COLUMN_ALIGNMENT
+    return offsets
+
+
+class StarCatalog:
+    """
+    Каталог звёзд в виде структуры массивов.
+    Каждое поле всех звёзд хранится непрерывным типизированным массивом numpy (см. CATALOG_COLUMNS),
+    колонка доступна по имени: catalog['apparent_magnitude']. Объекты создаются только
+    для отображаемых звёзд - см. StarView
+    """
+    def __init__(self, columns):
+        """
+        :param columns: Словарь колонок, ключи - имена колонок CATALOG_COLUMNS, значения - массивы одной длины
+        """
+        self.columns = {name: columns[name] for name, _ in CATALOG_COLUMNS}
+        # экваториальные векторы последней запрошенной эпохи: (эпоха, векторы)
+        self.epoch_vectors = None
+
+    def __len__(self):
+        return len(self.columns['right_ascension'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def keys(self):
+        return self.columns.keys()
+
+    def items(self):
+        return self.columns.items()
+
+    def view(self, index):
+        """
+        :param index: Номер звезды в каталоге
+        :return: Представление звезды - объект класса StarView
+        """
+        return StarView(self, int(index))
+
+    def get_equatorial_vectors(self, date=None):
+        """
+        Экваториальные единичные векторы звёзд на эпоху даты наблюдения с учётом собственного движения.
+        Эпоха округляется до EPOCH_RESOLUTION лет, векторы последней эпохи кэшируются, поэтому
+        пересчёт выполняется один раз для даты наблюдения, а не для каждого кадра
+        :param date: Дата наблюдения - объект datetime.datetime, None - эпоха J2000
+        :return: Массив numpy размера (N, 3)
+        """
+        years = 0 if date is None else round(star_handler.get_epoch_years(date) / EPOCH_RESOLUTION) * EPOCH_RESOLUTION
+        if self.epoch_vectors is None or self.epoch_vectors[0] != years:
+            vectors = star_handler.propagate_proper_motion(self['right_ascension'], self['declination'],
+                                                           self['pm_ra'], self['pm_dec'], years)
+            self.epoch_vectors = years, vectors
+        return self.epoch_vectors[1]
+
+    def update(self, positions, catalog):
+        """
+        Замена звёзд на месте. Закэшированные векторы эпохи пересчитываются только для заменённых звёзд
+        :param positions: Срез или массив номеров заменяемых звёзд
+        :param catalog: Каталог с новыми значениями
+        """
+        for name, column in catalog.items():
+            self.columns[name][positions] = column
+        if self.epoch_vectors is not None:
+            years, vectors = self.epoch_vectors
+            vectors[positions] = star_handler.propagate_proper_motion(catalog['right_ascension'],
+                                                                      catalog['declination'],
+                                                                      catalog['pm_ra'], catalog['pm_dec'], years)
+
+    def get_bytes_per_star(self):
+        """
+        :return: Количество байт, занимаемых одной звездой в колонках каталога
+        """
+        return sum(column.itemsize for column in self.columns.values())
+
+    def get_memory_usage(self):
+        """
+        :return: Количество байт, занимаемых колонками каталога
+        """
+        return sum(column.nbytes for column in self.columns.values())
+
+
+class StarView:
+    """
+    Легковесное представление одной звезды каталога. Хранит только ссылку на каталог и номер звезды,
+    поля читаются из колонок при обращении
+    """
+    __slots__ = ('catalog', 'index')
+
+    def __init__(self, catalog, index):
+        self.catalog = catalog
+        self.index = index
+
+    @property
+    def right_ascension(self):
+        return float(self.catalog['right_ascension'][self.index])
+
+    @property
+    def declination(self):
+        return float(self.catalog['declination'][self.index])
+
+    @property
+    def apparent_magnitude(self):
+        return float(self.catalog['apparent_magnitude'][self.index])
+
+    @property
+    def stellar_class(self):
+        return self.catalog['stellar_class'][self.index].decode('cp1251') or None
+
+    @property
+    def hd_number(self):
+        return int(self.catalog['hd_number'][self.index]) or None
+
+    @property
+    def proper_motion(self):
+        return float(self.catalog['pm_ra'][self.index]), float(self.catalog['pm_dec'][self.index])
+
+    @property
+    def info(self):
+        return star_handler.format_star_info(self.stellar_class, self.hd_number)
+
+
+def empty_catalog(count=0):
+    """
+    Создание каталога заданного размера, заполненного нулями
+    :param count: Количество звёзд
+    :return: Каталог - объект класса StarCatalog
+    """
+    return StarCatalog({name: numpy.zeros(count, dtype=dtype) for name, dtype in CATALOG_COLUMNS})
+
+
+def get_field(chars, name, first=0, last=None):
+    """
+    Получение колонки фиксированной ширины из массива строк
+    :param chars: Массив байтов строк каталога размера (N, ширина строки)
+    :param name: Имя поля (см. star_handler.STAR_COLUMNS)
+    :param first: Начало части поля (относительно начала поля)
+    :param last: Конец части поля, по умолчанию - конец поля
+    :return: Массив байтовых строк размера N
+    """
+    start, end = star_handler.STAR_COLUMNS[name]
+    end = end if last is None else start + last
+    start += first
+    return numpy.ascontiguousarray(chars[:, start:end]).view('S{}'.format(end - start)).ravel()
+
+
+def to_numbers(field, valid, dtype=float):
+    """
+    Преобразование колонки в числа. Если преобразовать всю колонку разом не удаётся,
+    строки преобразуются по одной, а неудачные помечаются как некорректные
+    :param field: Массив байтовых строк
+    :param valid: Булева маска корректных строк (изменяется)
+    :param dtype: Тип результата
+    :return: Массив чисел
+    """
+    try:
+        return field.astype(dtype)
+    except ValueError:
+        numbers = numpy.zeros(len(field), dtype=dtype)
+        for i, value in enumerate(field):
+            try:
+                numbers[i] = dtype(value)
+            except ValueError:
+                valid[i] = False
+        return numbers
+
+
+def get_line_width():
+    """
+    :return: Ширина строки каталога, достаточная для всех колонок star_handler.STAR_COLUMNS
+    """
+    return max(end for _, end in star_handler.STAR_COLUMNS.values())
+
+
+def parse_columns(chars, lengths):
+    """
+    Разбор строк каталога по колонкам фиксированной ширины (star_handler.STAR_COLUMNS).
+    Каждое поле преобразуется сразу для всех строк, значения совпадают с star_handler.parse_star_fields.
+    Спектральный класс остаётся в кодировке cp1251 и декодируется только при отображении
+    :param chars: Массив байтов строк размера (N, get_line_width()), короткие строки дополнены пробелами
+    :param lengths: Массив длин строк (без символов перевода строки)
+    :return: Кортеж (каталог корректных строк, булева маска строк, соответствующих формату)
+    """
+    width = chars.shape[1]
+    ra_start = star_handler.STAR_COLUMNS['right_ascension'][0]
+    dec_start = star_handler.STAR_COLUMNS['declination'][0]
+    valid = ((lengths >= width) &
+             (chars[:, ra_start + 2] == ord(':')) & (chars[:, ra_start + 5] == ord(':')) &
+             (chars[:, ra_start + 8] == ord('.')) &
+             (chars[:, dec_start + 3] == ord(':')) & (chars[:, dec_start + 6] == ord(':')) &
+             ((chars[:, dec_start] == ord('+')) | (chars[:, dec_start] == ord('-'))) &
+             ~UNDECODABLE[chars].any(axis=1))
+    # в некорректных строках поля заменяются пробелами, чтобы не мешать преобразованию остальных
+    chars = numpy.where(valid[:, None], chars, ord(' ')).astype(numpy.uint8)
+    blank = ~valid
+
+    def numbers(name, first=0, last=None, dtype=float):
+        field = get_field(chars, name, first, last)
+        field[blank] = b'0'
+        return to_numbers(field, valid, dtype)
+
+    right_ascension = (numbers('right_ascension', 0, 2) + numbers('right_ascension', 3, 5) / 60 +
+                       numbers('right_ascension', 6) / 3600) * 15
+
+    sign = numpy.where(chars[:, dec_start] == ord('-'), -1.0, 1.0)
+    declination = sign * (numbers('declination', 1, 3) + numbers('declination', 4, 6) / 60 +
+                          numbers('declination', 7) / 3600)
+
+    # как и MAGNITUDE_REGEX, знак звёздной величины не учитывается
+    magnitude = get_field(chars, 'apparent_magnitude')
+    valid &= numpy.char.find(magnitude, b'.') >= 0
+    apparent_magnitude = numpy.abs(numbers('apparent_magnitude'))
+
+    hd_number = numpy.char.strip(get_field(chars, 'hd_number'))
+    hd_number[~numpy.char.isdigit(hd_number)] = b'0'
+    pm_ra, pm_dec = numbers('pm_ra'), numbers('pm_dec')
+
+    catalog = empty_catalog(int(valid.sum()))
+    catalog['right_ascension'][:] = right_ascension[valid]
+    catalog['declination'][:] = declination[valid]
+    catalog['apparent_magnitude'][:] = apparent_magnitude[valid]
+    catalog['stellar_class'][:] = [(field.split() or [b''])[0]
+                                   for field in get_field(chars, 'stellar_class')[valid]]
+    catalog['hd_number'][:] = hd_number[valid].astype(int)
+    catalog['pm_ra'][:] = pm_ra[valid]
+    catalog['pm_dec'][:] = pm_dec[valid]
+    return catalog, valid
+
+
+def map_source(file):
+    """
+    Отображение открытого файла в память только для чтения
+    :param file: Файл, открытый в двоичном режиме
+    :return: Контекстный менеджер, возвращающий объект mmap (или пустую строку байтов для пустого файла)
+    """
+    if not os.fstat(file.fileno()).st_size:
+        return contextlib.nullcontext(b'')
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def get_line_bounds(buffer):
+    """
+    Поиск границ строк в байтах файла
+    :param buffer: Массив байтов файла (numpy.uint8)
+    :return: Кортеж массивов (начала строк, концы строк без символов перевода строки, номера строк начиная с 1)
+    """
+    ends = numpy.flatnonzero(buffer == ord('\n'))
+    starts = numpy.concatenate([[0], ends + 1])
+    ends = numpy.concatenate([ends, [len(buffer)]])
+    line_numbers = numpy.arange(1, len(starts) + 1)
+
+    # пустой остаток после последнего перевода строки не считается строкой
+    if len(starts) and starts[-1] == len(buffer):
+        starts, ends, line_numbers = starts[:-1], ends[:-1], line_numbers[:-1]
+
+    carriage_returns = ends > starts
+    carriage_returns[carriage_returns] = buffer[ends[carriage_returns] - 1] == ord('\r')
+    return starts, ends - carriage_returns, line_numbers
+
+
+def get_line_chars(buffer, starts, ends, width):
+    """
+    Сборка строк в двумерный массив фиксированной ширины
+    :param buffer: Массив байтов файла (numpy.uint8)
+    :param starts: Начала строк
+    :param ends: Концы строк
+    :param width: Ширина массива, строки обрезаются или дополняются пробелами
+    :return: Массив байтов размера (количество строк, width)
+    """
+    chars = numpy.empty((len(starts), width), dtype=numpy.uint8)
+    last = max(len(buffer) - 1, 0)
+    # строки собираются блоками, чтобы не создавать массив индексов размера всего файла
+    for first in range(0, len(starts), LINES_BLOCK_SIZE):
+        block = slice(first, first + LINES_BLOCK_SIZE)
+        positions = starts[block, None] + numpy.arange(width)
+        chars[block] = numpy.where(positions < ends[block, None], buffer[numpy.minimum(positions, last)], ord(' '))
+    return chars
+
+
+def parse_source(filename):
+    """
+    Разбор одного текстового файла каталога в колонки.
+    Файл отображается в память и разбирается по колонкам (parse_columns) без декодирования строк,
+    строки нестандартного формата декодируются и разбираются по одной (star_handler.parse_star_fields)
+    :param filename: Путь до файла
+    :return: Кортеж (каталог, список ошибок). Ошибка - строка вида "файл:строка: описание"
+    """
+    errors = []
+    try:
+        with open(filename, 'rb') as file, map_source(file) as data:
+            buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+            starts, ends, line_numbers = get_line_bounds(buffer)
+            chars = get_line_chars(buffer, starts, ends, get_line_width())
+            # строки из пробельных символов пропускаются
+            filled = ~WHITESPACE[chars].all(axis=1) | (ends - starts > chars.shape[1])
+            starts, ends, line_numbers = starts[filled], ends[filled], line_numbers[filled]
+            catalog, valid = parse_columns(chars[filled], ends - starts)
+            # копируются только строки, не подошедшие под формат колонок
+            malformed = [(position, int(line_numbers[position]), data[starts[position]:ends[position]])
+                         for position in numpy.flatnonzero(~valid)]
+            del buffer
+    except OSError as error:
+        return empty_catalog(), ['{}: {}'.format(filename, error)]
+
+    positions = [numpy.flatnonzero(valid)]
+    rows = []
+    for position, line_number, line in malformed:
+        if not line.strip():
+            continue
+        try:
+            rows.append(star_handler.parse_star_fields(line.decode('cp1251')))
+            positions.append([position])
+        except (ValueError, UnicodeDecodeError) as error:
+            errors.append('{}:{}: {}'.format(filename, line_number, error))
+    if not rows:
+        return catalog, errors
+
+    parsed = empty_catalog(len(rows))
+    for i, (right_ascension, declination, magnitude, stellar_class, hd_number, proper_motion) in enumerate(rows):
+        parsed['right_ascension'][i] = right_ascension
+        parsed['declination'][i] = declination
+        parsed['apparent_magnitude'][i] = magnitude
+        parsed['stellar_class'][i] = (stellar_class or '').encode('cp1251')
+        parsed['hd_number'][i] = hd_number or 0
+        parsed['pm_ra'][i], parsed['pm_dec'][i] = proper_motion
+    # восстановление исходного порядка строк
+    order = numpy.argsort(numpy.concatenate(positions), kind='stable')
+    return select_stars(merge_catalogs([catalog, parsed]), order), errors
+
+
+def merge_catalogs(catalogs):
+    """
+    Объединение нескольких каталогов в один с сохранением порядка
+    :param catalogs: Список каталогов
+    :return: Каталог - объект класса StarCatalog
+    """
+    if not catalogs:
+        return empty_catalog()
+    return StarCatalog({name: numpy.concatenate([catalog[name] for catalog in catalogs]).astype(dtype, copy=False)
+                        for name, dtype in CATALOG_COLUMNS})
+
+
+def parse_source_files(filenames, workers=1):
+    """
+    Разбор текстовых файлов каталога по отдельности
+    :param filenames: Список путей до файлов
+    :param workers: Количество процессов для разбора файлов (см. parse_sources)
+    :return: Список кортежей (каталог файла, список ошибок) в порядке файлов
+    """
+    if workers == 1 or len(filenames) < 2:
+        return [parse_source(filename) for filename in filenames]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse_source, filenames))
+
+
+def parse_sources(filenames, workers=1):
+    """
+    Разбор текстовых файлов каталога в колонки.
+    Строки, из которых не удалось извлечь координаты или звёздную величину, пропускаются и попадают в список ошибок
+    :param filenames: Список путей до файлов
+    :param workers: Количество процессов для разбора файлов. 1 - разбор в текущем процессе,
+    None - по количеству процессоров. Порядок звёзд не зависит от количества процессов
+    :return: Кортеж (каталог, список ошибок)
+    """
+    results = parse_source_files(filenames, workers=workers)
+    errors = [error for _, file_errors in results for error in file_errors]
+    return merge_catalogs([catalog for catalog, _ in results]), errors
+
+
+def get_errors_offset(count):
+    """
+    Вычисление смещения блока ошибок разбора (следует за последней колонкой)
+    :param count: Количество звёзд в каталоге
+    :return: Смещение относительно начала файла каталога
+    """
+    _, dtype, offset = get_column_offsets(count)[-1]
+    size = numpy.dtype(dtype).itemsize * count
+    return offset + size + (-size) % COLUMN_ALIGNMENT
+
+
+def write_catalog(catalog, catalog_path, signature, errors=()):
+    """
+    Запись каталога в бинарный файл. Файл сначала пишется во временный, затем атомарно подменяется
+    :param catalog: Каталог - объект класса StarCatalog
+    :param catalog_path: Путь до файла каталога
+    :param signature: Хэш исходных файлов
+    :param errors: Список ошибок разбора, сохраняемый вместе с каталогом
+    """
+    count = len(catalog['right_ascension'])
+    temp_path = catalog_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        header = struct.pack(HEADER_FORMAT, CATALOG_MAGIC, CATALOG_VERSION, count, signature)
+        file.write(header.ljust(HEADER_SIZE, b'\0'))
+        for name, dtype, offset in get_column_offsets(count):
+            file.seek(offset)
+            file.write(numpy.ascontiguousarray(catalog[name], dtype=dtype).tobytes())
+        data = '\n'.join(errors).encode('utf-8')
+        file.seek(get_errors_offset(count))
+        file.write(struct.pack('<I', len(data)) + data)
+    os.replace(temp_path, catalog_path)
+
+
+def read_catalog_header(catalog_path):
+    """
+    Чтение заголовка скомпилированного каталога
+    Выбрасывает исключение ValueError, если файл не является каталогом поддерживаемой версии
+    :param catalog_path: Путь до файла каталога
+    :return: Кортеж (количество звёзд, хэш исходных файлов)
+    """
+    with open(catalog_path, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError('Catalog file is truncated')
+    magic, version, count, signature = struct.unpack_from(HEADER_FORMAT, header)
+    if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+        raise ValueError('Unsupported catalog format')
+    return count, signature
+
+
+def read_catalog(catalog_path):
+    """
+    Чтение скомпилированного каталога. Колонки отображаются в память и не копируются
+    :param catalog_path: Путь до файла каталога
+    :return: Каталог - объект класса StarCatalog (только для чтения)
+    """
+    count, _ = read_catalog_header(catalog_path)
+    if not count:
+        return empty_catalog()
+    data = numpy.memmap(catalog_path, dtype=numpy.uint8, mode='r')
+    columns = {}
+    for name, dtype, offset in get_column_offsets(count):
+        size = numpy.dtype(dtype).itemsize * count
+        if offset + size > len(data):
+            raise ValueError('Catalog file is truncated')
+        columns[name] = data[offset:offset + size].view(dtype)
+    return StarCatalog(columns)
+
+
+def read_catalog_errors(catalog_path):
+    """
+    Чтение ошибок разбора, сохранённых при компиляции каталога
+    :param catalog_path: Путь до файла каталога
+    :return: Список ошибок
+    """
+    count, _ = read_catalog_header(catalog_path)
+    with open(catalog_path, 'rb') as file:
+        file.seek(get_errors_offset(count))
+        length = file.read(4)
+        if len(length) < 4:
+            raise ValueError('Catalog file is truncated')
+        data = file.read(struct.unpack('<I', length)[0])
+    return data.decode('utf-8').split('\n') if data else []
+
+
+def compile_catalog(path, catalog_path=None, workers=1):
+    """
+    Компиляция папки с текстовыми файлами звёзд в бинарный каталог
+    :param path: Папка, содержащая звезды (*.txt)
+    :param catalog_path: Путь до файла каталога, по умолчанию - файл CATALOG_FILENAME в папке path
+    :param workers: Количество процессов для разбора файлов (см. parse_sources)
+    :return: Кортеж (каталог, список ошибок разбора)
+    """
+    if catalog_path is None:
+        catalog_path = os.path.join(path, CATALOG_FILENAME)
+    filenames = get_source_files(path)
+    signature = get_sources_signature(filenames)
+    catalog, errors = parse_sources(filenames, workers=workers)
+    try:
+        write_catalog(catalog, catalog_path, signature, errors)
+    except OSError:
+        # папка может быть недоступна для записи - в этом случае работаем без кэша
+        pass
+    return catalog, errors
+
+
+def load_catalog(path, catalog_path=None, workers=1):
+    """
+    Загрузка каталога звёзд. Если скомпилированный каталог отсутствует или
+    исходные файлы были изменены - каталог перекомпилируется
+    :param path: Папка, содержащая звезды (*.txt)
+    :param catalog_path: Путь до файла каталога, по умолчанию - файл CATALOG_FILENAME в папке path
+    :param workers: Количество процессов для разбора файлов при перекомпиляции (см. parse_sources)
+    :return: Кортеж (каталог, список ошибок разбора). При чтении скомпилированного каталога
+    возвращаются ошибки, сохранённые при его компиляции
+    """
+    if catalog_path is None:
+        catalog_path = os.path.join(path, CATALOG_FILENAME)
+    signature = get_sources_signature(get_source_files(path))
+    try:
+        _, cached_signature = read_catalog_header(catalog_path)
+        if cached_signature == signature:
+            return read_catalog(catalog_path), read_catalog_errors(catalog_path)
+    except (OSError, ValueError):
+        pass
+    return compile_catalog(path, catalog_path, workers=workers)
+
+
+def get_file_state(filename):
+    """
+    :param filename: Путь до файла
+    :return: Список [размер, время изменения в наносекундах] - по нему определяется изменение файла
+    """
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_catalog_cap(catalog):
+    """
+    Вычисление шапки на небесной сфере (центр и угловой радиус), содержащей все звёзды каталога
+    :param catalog: Каталог - объект класса StarCatalog
+    :return: Кортеж (единичный вектор центра в виде списка, радиус в градусах) или None для пустого каталога
+    """
+    if not len(catalog):
+        return None
+    vectors = star_handler.get_equatorial_vectors(catalog['right_ascension'], catalog['declination'])
+    center = vectors.sum(axis=0)
+    length = numpy.linalg.norm(center)
+    if length < 1e-9:
+        return [0.0, 0.0, 1.0], 180.0
+    center /= length
+    return center.tolist(), math.degrees(math.acos(max(-1.0, min(1.0, float((vectors @ center).min())))))
+
+
+class LazyCatalog:
+    """
+    Каталог, загружаемый по файлам созвездий. Для каждого файла в индексе (CAPS_FILENAME) хранится шапка
+    на небесной сфере, содержащая его звёзды, поэтому разбираются только файлы, пересекающиеся с конусом
+    взгляда. Остальные файлы разбираются в фоновом процессе по мере перемещения взгляда (см. request, collect)
+    """
+    def __init__(self, path, caps_path=None):
+        """
+        :param path: Папка, содержащая звезды (*.txt)
+        :param caps_path: Путь до файла индекса, по умолчанию - файл CAPS_FILENAME в папке path
+        """
+        self.path = path
+        self.caps_path = caps_path if caps_path is not None else os.path.join(path, CAPS_FILENAME)
+        self.catalogs = {}
+        self.errors = []
+        self.pending = {}
+        self.executor = None
+        self.caps = self.load_caps()
+
+    def load_caps(self):
+        """
+        Чтение индекса шапок. Записи новых и изменённых (по размеру и времени изменения) файлов
+        вычисляются заново, разобранные при этом файлы сохраняются как загруженные
+        :return: Словарь {имя файла: {'state': состояние файла, 'cap': шапка или None}}
+        """
+        try:
+            with open(self.caps_path, 'r', encoding='utf-8') as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            cached = {}
+
+        caps = {}
+        for filename in get_source_files(self.path):
+            name = os.path.basename(filename)
+            state = get_file_state(filename)
+            entry = cached.get(name)
+            if entry is None or entry.get('state') != state:
+                catalog, errors = parse_source(filename)
+                self.add(filename, catalog, errors)
+                entry = {'state': state, 'cap': get_catalog_cap(catalog)}
+            caps[name] = entry
+
+        if caps != cached:
+            try:
+                with open(self.caps_path, 'w', encoding='utf-8') as file:
+                    json.dump(caps, file)
+            except OSError:
+                # папка может быть недоступна для записи - в этом случае индекс строится при каждом запуске
+                pass
+        return caps
+
+    def get_missing_files(self, direction, radius):
+        """
+        Поиск незагруженных файлов, шапки которых пересекаются с конусом
+        :param direction: Экваториальный вектор оси конуса (не обязательно единичный)
+        :param radius: Угловой радиус конуса в градусах
+        :return: Список путей до файлов
+        """
+        direction = numpy.asarray(direction, dtype=float)
+        direction = direction / numpy.linalg.norm(direction)
+        filenames = []
+        for name, entry in sorted(self.caps.items()):
+            filename = os.path.join(self.path, name)
+            if entry['cap'] is None or filename in self.catalogs or filename in self.pending:
+                continue
+            center, cap_radius = entry['cap']
+            distance = math.degrees(math.acos(max(-1.0, min(1.0, float(numpy.dot(center, direction))))))
+            if distance <= cap_radius + radius:
+                filenames.append(filename)
+        return filenames
+
+    def add(self, filename, catalog, errors):
+        """
+        Добавление разобранного файла
+        :param filename: Путь до файла
+        :param catalog: Каталог файла
+        :param errors: Список ошибок разбора
+        """
+        self.catalogs[filename] = catalog
+        self.errors.extend(errors)
+
+    def load_files(self, filenames):
+        """
+        Разбор файлов в текущем потоке
+        :param filenames: Список путей до файлов
+        """
+        for filename in filenames:
+            self.add(filename, *parse_source(filename))
+
+    def request(self, direction, radius):
+        """
+        Запуск фонового разбора незагруженных файлов, пересекающихся с конусом
+        :param direction: Экваториальный вектор оси конуса
+        :param radius: Угловой радиус конуса в градусах
+        :return: True, если есть файлы, ожидающие разбора
+        """
+        filenames = self.get_missing_files(direction, radius)
+        if filenames and self.executor is None:
+            # разбор выполняется в отдельном процессе, чтобы не занимать GIL потока интерфейса.
+            # Процесс запускается заново (spawn), а не копированием многопоточного процесса интерфейса (fork)
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=1,
+                                                                   mp_context=multiprocessing.get_context('spawn'))
+        for filename in filenames:
+            self.pending[filename] = self.executor.submit(parse_source, filename)
+        return bool(self.pending)
+
+    def collect(self):
+        """
+        Добавление файлов, разбор которых в фоновом процессе завершился
+        :return: Список путей до добавленных файлов
+        """
+        done = [filename for filename, future in self.pending.items() if future.done()]
+        for filename in done:
+            self.add(filename, *self.pending.pop(filename).result())
+        return done
+
+    def close(self):
+        """
+        Остановка фонового процесса. Файлы, разбор которых не начался, не загружаются
+        """
+        for future in self.pending.values():
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.pending = {}
+
+    def get_catalog(self):
+        """
+        :return: Каталог из всех загруженных файлов (в порядке имён файлов) - объект класса StarCatalog
+        """
+        return merge_catalogs([self.catalogs[filename] for filename in sorted(self.catalogs)])
+
+
+def get_file_digest(filename):
+    """
+    :param filename: Путь до файла
+    :return: SHA-1 дайджест содержимого файла
+    """
+    with open(filename, 'rb') as file:
+        return hashlib.sha1(file.read()).digest()
+
+
+class CatalogManager:
+    """
+    Каталог, отслеживающий изменения текстовых файлов. Для каждого файла хранятся размер, время изменения
+    и хэш содержимого: refresh разбирает заново только файлы, содержимое которых изменилось, и обновляет
+    колонки каталога и индекс направлений (sphere_index) на месте. Если количество звёзд в файлах
+    не изменилось, объекты каталога и индекса сохраняются, иначе собираются заново из уже разобранных файлов.
+    Индекс строится по экваториальным векторам эпохи date (см. StarCatalog.get_equatorial_vectors).
+    refresh и set_date изменяют каталог под блокировкой, читатели из других потоков получают каталог
+    и индекс через snapshot
+    """
+    def __init__(self, path, workers=1, date=None):
+        """
+        :param path: Папка, содержащая звезды (*.txt)
+        :param workers: Количество процессов для первоначального разбора файлов (см. parse_sources)
+        :param date: Дата наблюдения - объект datetime.datetime, None - эпоха J2000
+        """
+        self.path = path
+        self.date = date
+        self.lock = threading.Lock()
+        self.files = {}
+        filenames = get_source_files(path)
+        states = [self.get_state(filename) for filename in filenames]
+        results = parse_source_files(filenames, workers=workers)
+        for filename, state, (catalog, errors) in zip(filenames, states, results):
+            if state is not None:
+                self.files[filename] = {'state': state[0], 'digest': state[1], 'catalog': catalog, 'errors': errors}
+        self.build()
+
+    @staticmethod
+    def get_state(filename):
+        """
+        :param filename: Путь до файла
+        :return: Кортеж (размер и время изменения, хэш содержимого) или None, если файл недоступен
+        """
+        try:
+            return get_file_state(filename), get_file_digest(filename)
+        except OSError:
+            return None
+
+    @property
+    def errors(self):
+        """
+        :return: Список ошибок разбора всех файлов
+        """
+        return [error for filename in sorted(self.files) for error in self.files[filename]['errors']]
+
+    def build(self):
+        """
+        Сборка каталога и индекса направлений из разобранных файлов.
+        Звёзды файла занимают в каталоге диапазон номеров ranges[filename] = (первая звезда, последняя звезда + 1)
+        """
+        filenames = sorted(self.files)
+        self.catalog = merge_catalogs([self.files[filename]['catalog'] for filename in filenames])
+        bounds = numpy.cumsum([0] + [len(self.files[filename]['catalog']) for filename in filenames]).tolist()
+        self.ranges = dict(zip(filenames, zip(bounds[:-1], bounds[1:])))
+        self.sphere_index = spatial_index.SphereIndex(self.catalog.get_equatorial_vectors(self.date))
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """
+        Чтение каталога: пока выполняется блок with, refresh и set_date не изменяют каталог, индекс и ranges
+        :return: Кортеж (каталог, индекс направлений)
+        """
+        with self.lock:
+            yield self.catalog, self.sphere_index
+
+    def set_date(self, date):
+        """
+        Смена даты наблюдения. Индекс строится заново, только если сменилась эпоха векторов
+        :param date: Дата наблюдения - объект datetime.datetime, None - эпоха J2000
+        """
+        with self.lock:
+            self.date = date
+            vectors = self.catalog.get_equatorial_vectors(date)
+            if vectors is not self.sphere_index.vectors:
+                self.sphere_index = spatial_index.SphereIndex(vectors)
+
+    def refresh(self):
+        """
+        Проверка файлов и обновление изменённых. Метод можно вызывать периодически, в том числе из другого потока:
+        файлы, изменяемые во время проверки, будут разобраны заново при следующем вызове
+        :return: Список путей до добавленных, изменённых и удалённых файлов
+        """
+        with self.lock:
+            filenames = get_source_files(self.path)
+            removed = sorted(set(self.files) - set(filenames))
+            changed = []
+            for filename in filenames:
+                entry = self.files.get(filename)
+                try:
+                    state = get_file_state(filename)
+                    if entry is not None and entry['state'] == state:
+                        continue
+                    digest = get_file_digest(filename)
+                except OSError:
+                    continue
+                if entry is not None and entry['digest'] == digest:
+                    entry['state'] = state
+                    continue
+                catalog, errors = parse_source(filename)
+                changed.append((filename, entry is not None and len(entry['catalog']) == len(catalog)))
+                self.files[filename] = {'state': state, 'digest': digest, 'catalog': catalog, 'errors': errors}
+
+            for filename in removed:
+                del self.files[filename]
+            if removed or not all(same_size for _, same_size in changed):
+                self.build()
+            else:
+                for filename, _ in changed:
+                    self.patch(filename)
+            return sorted(removed + [filename for filename, _ in changed])
+
+    def patch(self, filename):
+        """
+        Замена звёзд файла в каталоге и индексе на месте (количество звёзд файла не изменилось)
+        :param filename: Путь до файла
+        """
+        catalog = self.files[filename]['catalog']
+        positions = numpy.arange(*self.ranges[filename])
+        self.catalog.update(positions, catalog)
+        self.sphere_index.update(positions, self.catalog.get_equatorial_vectors(self.date)[positions])
+
+
+def catalog_star(catalog, index, observer):
+    """
+    Создание объекта Star по строке каталога
+    :param catalog: Каталог - объект класса StarCatalog
+    :param index: Номер звезды в каталоге
+    :param observer: Наблюдатель - экземпляр класса coordinates_handler.Observer
+    :return: Звезда - объект класса star_handler.Star
+    """
+    star = star_handler.Star(None, observer)
+    star.fill(float(catalog['right_ascension'][index]), float(catalog['declination'][index]),
+              float(catalog['apparent_magnitude'][index]),
+              catalog['stellar_class'][index].decode('cp1251'),
+              int(catalog['hd_number'][index]), observer)
+    return star
+
+
+def select_stars(catalog, selection):
+    """
+    Выборка звёзд из каталога
+    :param catalog: Каталог - объект класса StarCatalog
+    :param selection: Булева маска или массив номеров звёзд
+    :return: Новый каталог, содержащий только выбранные звёзды
+    """
+    return StarCatalog({name: column[selection] for name, column in catalog.items()})
+
+
+def parse_brightness(bright):
+    """
+    Разбор фильтра яркости
+    :param bright: Строка вида "more N" или "less N"
+    :return: Кортеж (операция 'more' или 'less', звёздная величина N)
+    """
+    bright_operand, bright_value = bright.split()
+    return bright_operand, float(bright_value)
+
+
+def filter_by_brightness(catalog, bright):
+    """
+    Фильтрация каталога по видимой звёздной величине
+    :param catalog: Каталог - объект класса StarCatalog
+    :param bright: Строка вида "more N" или "less N": звёзды с величиной не меньше (не больше) N
+    :return: Новый каталог
+    """
+    bright_operand, bright_value = parse_brightness(bright)
+
+    magnitudes = catalog['apparent_magnitude']
+    if bright_operand == 'more':  # The brighter an object appears, the lower its magnitude value
+        return select_stars(catalog, magnitudes >= bright_value)
+    return select_stars(catalog, magnitudes <= bright_value)
+
+
+def get_brightness_order(catalog):
+    """
+    :param catalog: Каталог - объект класса StarCatalog
+    :return: Массив номеров звёзд, упорядоченных по видимой звёздной величине (от ярких звёзд к тусклым)
+    """
+    return numpy.argsort(catalog['apparent_magnitude'], kind='stable')
+
+
+def sort_by_brightness(catalog):
+    """
+    Упорядочивание каталога по видимой звёздной величине (от ярких звёзд к тусклым)
+    :param catalog: Каталог - объект класса StarCatalog
+    :return: Новый каталог
+    """
+    return select_stars(catalog, get_brightness_order(catalog))
+
+
+def get_brightness_range(magnitudes, bright_operand, bright_value):
+    """
+    Поиск звёзд, проходящих фильтр яркости, в упорядоченном по звёздной величине каталоге.
+    Такие звёзды образуют непрерывный диапазон, границы которого находятся двоичным поиском
+    :param magnitudes: Упорядоченный по возрастанию массив звёздных величин
+    :param bright_operand: Операция фильтра - 'more' или 'less'
+    :param bright_value: Звёздная величина фильтра
+    :return: Кортеж (номер первой звезды, номер последней звезды + 1)
+    """
+    if bright_operand == 'more':
+        return int(numpy.searchsorted(magnitudes, bright_value, side='left')), len(magnitudes)
+    return 0, int(numpy.searchsorted(magnitudes, bright_value, side='right'))
+
+
+def get_magnitude_tiers(magnitudes, step=1):
+    """
+    Разбиение упорядоченного по звёздной величине каталога на уровни яркости.
+    Каждый уровень - непрерывный диапазон звёзд, величины которых отличаются не больше чем на step
+    :param magnitudes: Упорядоченный по возрастанию массив звёздных величин
+    :param step: Ширина уровня в звёздных величинах
+    :return: Список пар (номер первой звезды уровня, номер последней звезды уровня + 1), от ярких к тусклым
+    """
+    if not len(magnitudes):
+        return []
+    limits = numpy.arange(math.floor(magnitudes[0] / step) + 1, math.floor(magnitudes[-1] / step) + 1) * step
+    bounds = [0] + numpy.searchsorted(magnitudes, limits, side='left').tolist() + [len(magnitudes)]
+    return [(first, last) for first, last in zip(bounds, bounds[1:]) if first < last]
@@ -1,8 +1,13 @@
 import math
 import datetime
+import numpy
 from . import star_handler
 
 
+# Скорость изменения звёздного времени (градусов в секунду), см. Observer.calc_local_sidereal_time
+SIDEREAL_RATE = 15 / 3600 + 0.985647 / 86400
+
+
 class Observer:
     """
     Наблюдатель и его координаты
@@ -13,6 +18,7 @@ class Observer:
         self.long = None
         self.date = None
         self.local_sidereal_time = None
+        self.rotation_matrix = None
         self.view_vector = None
 
     def __str__(self):
@@ -22,6 +28,22 @@ class Observer:
     def calibrate_sidereal_time(self):
         if self.long and self.date:
             self.calc_local_sidereal_time()
+            self.calc_rotation_matrix()
+
+    def calc_rotation_matrix(self):
+        """
+        Метод вычисляет матрицу перехода от экваториальных единичных векторов (J2000)
+        к горизонтальным векторам наблюдателя. Результат совпадает с переходом
+        star_handler.Star.ra_dec_to_alt_az с последующим spherical_to_cartesian:
+        x = cos(alt)cos(az), y = cos(alt)sin(az), z = sin(alt)
+        """
+        theta = degrees_to_radians(self.local_sidereal_time + self.long.decimal)
+        latitude = degrees_to_radians(self.lat.decimal)
+        sin_t, cos_t = math.sin(theta), math.cos(theta)
+        sin_l, cos_l = math.sin(latitude), math.cos(latitude)
+        self.rotation_matrix = numpy.array([[sin_l * cos_t, sin_l * sin_t, -cos_l],
+                                            [sin_t, -cos_t, 0],
+                                            [cos_l * cos_t, cos_l * sin_t, sin_l]])
 
     def calc_local_sidereal_time(self):
         """
@@ -34,6 +56,20 @@ class Observer:
                                           self.date.minute / 60 +
                                           self.date.second / 3600) + 360) % 360
 
+    def advance_time(self, seconds):
+        """
+        Сдвиг даты наблюдения. Звёздное время изменяется на величину, пропорциональную сдвигу,
+        что соответствует повороту неба вокруг оси мира
+        :param seconds: Сдвиг в секундах (может быть дробным или отрицательным)
+        :return: Матрица поворота размера (3, 3), переводящая горизонтальные векторы на прежнюю дату
+        в горизонтальные векторы на новую дату
+        """
+        previous = self.rotation_matrix
+        self.date += datetime.timedelta(seconds=seconds)
+        self.local_sidereal_time = (self.local_sidereal_time + SIDEREAL_RATE * seconds) % 360
+        self.calc_rotation_matrix()
+        return self.rotation_matrix @ previous.T
+
     def set_date(self, date=None):
         """
         Метод устанавливает переданную дату, если дата не была передана - устанавливается текущая дата
@@ -45,9 +81,10 @@ class Observer:
             if not isinstance(date, datetime.datetime):
                 raise TypeError('Date must be datetime object')
             self.date = date
-            return
-        date = datetime.datetime.today()
-        self.date = date.utcnow()
+        else:
+            date = datetime.datetime.today()
+            self.date = date.utcnow()
+        self.calibrate_sidereal_time()
 
     def set_view_vector(self, vector):
         """
@@ -84,6 +121,7 @@ class Observer:
         self.lat, self.long = AngleMeasuresDMS(), AngleMeasuresDMS()
         self.lat.parse_coordinates(latitude, decimal=True)
         self.long.parse_coordinates(longitude, decimal=True)
+        self.calibrate_sidereal_time()
 
     def set_geo_dms_coordinates(self, latitude, longitude):
         """
@@ -94,12 +132,15 @@ class Observer:
         self.lat, self.long = AngleMeasuresDMS(), AngleMeasuresDMS()
         self.lat.parse_coordinates(latitude, decimal=False)
         self.long.parse_coordinates(longitude, decimal=False)
+        self.calibrate_sidereal_time()
 
 
 class AngleMeasuresDMS:
     """
     Формат измерения угла - градусы, минуты, секунды
     """
+    __slots__ = ('sign', 'degrees', 'minutes', 'seconds', 'decimal')
+
     def __init__(self):
         self.sign = None
         self.degrees = None
@@ -155,6 +196,8 @@ class AngleMeasuresHMS:
     """
     Формат измерения угла - часы, минуты, секунды
     """
+    __slots__ = ('hours', 'minutes', 'seconds', 'decimal')
+
     def __init__(self):
         self.hours = None
         self.minutes = None
@@ -195,6 +238,8 @@ class AngleMeasuresHMS:
 
 
 class Vector:
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x, y, z):
         if all(isinstance(i, (int, float)) for i in [x, y, z]):
             self.x = x
@@ -260,6 +305,8 @@ class Vector:
 
 
 class Quaternion:
+    __slots__ = ('vector', 'scalar', 'conjunct')
+
     def __init__(self, vector, scalar):
         if isinstance(vector, Vector) and isinstance(scalar, (int, float)):
             self.vector = vector
@@ -281,18 +328,42 @@ class Quaternion:
         return self.conjunct
 
     def reversed(self):
-        return self.get_conjunct() * (1 / self.get_length())
+        # кэшированное сопряжение не изменяется: умножение на число изменяет кватернион на месте
+        conjunct = self.get_conjunct()
+        length = self.get_length()
+        return Quaternion(conjunct.vector * (1 / length), conjunct.scalar * (1 / length))
 
     def normalize(self):
         length = self.get_length()
         self.vector *= (1 / length)
         self.scalar *= (1 / length)
+        self.conjunct = None
 
     def rotate_vector(self, vector):
         if isinstance(vector, Vector):
             new_quat = self * Quaternion(vector, 0) * self.reversed()
             return new_quat.vector
 
+    def to_rotation_matrix(self):
+        """
+        Перевод кватерниона в матрицу поворота. Для нормализованного кватерниона
+        произведение матрицы на вектор совпадает с rotate_vector
+        :return: Матрица поворота - массив numpy размера (3, 3)
+        """
+        x, y, z, w = self.vector.x, self.vector.y, self.vector.z, self.scalar
+        scale = 2 / (x * x + y * y + z * z + w * w)
+        return numpy.array([[1 - scale * (y * y + z * z), scale * (x * y - w * z), scale * (x * z + w * y)],
+                            [scale * (x * y + w * z), 1 - scale * (x * x + z * z), scale * (y * z - w * x)],
+                            [scale * (x * z - w * y), scale * (y * z + w * x), 1 - scale * (x * x + y * y)]])
+
+    def rotate_vectors(self, vectors):
+        """
+        Поворот массива векторов одним матричным произведением
+        :param vectors: Массив numpy размера (N, 3)
+        :return: Массив повёрнутых векторов размера (N, 3)
+        """
+        return numpy.asarray(vectors, dtype=float) @ self.to_rotation_matrix().T
+
     @staticmethod
     def get_quaternion(vector1, vector2):
         """
@@ -315,6 +386,7 @@ class Quaternion:
         if isinstance(other, (int, float)):
             self.vector *= other
             self.scalar *= other
+            self.conjunct = None
             return self
         if isinstance(other, Quaternion):
             new_vector = (Vector.cross_product(self.vector, other.vector) +
@@ -355,6 +427,58 @@ def spherical_to_cartesian(elevation, azimuth, radius=1):
     return vector
 
 
+def spherical_to_cartesian_arrays(elevation, azimuth, radius=1):
+    """
+    Векторизованный перевод сферических координат в декартовы
+    :param elevation: Массив сферических координат (в градусах)
+    :param azimuth: Массив сферических координат (в градусах)
+    :param radius: Константа, не имеющая значения
+    :return: Массив векторов numpy размера (N, 3)
+    """
+    elevation = numpy.radians(elevation)
+    azimuth = numpy.radians(azimuth)
+
+    vectors = numpy.empty((len(elevation), 3))
+    vectors[:, 0] = radius * numpy.cos(elevation) * numpy.cos(azimuth)
+    vectors[:, 1] = radius * numpy.cos(elevation) * numpy.sin(azimuth)
+    vectors[:, 2] = radius * numpy.sin(elevation)
+    return vectors
+
+
+def get_local_sidereal_times(dates, longitudes):
+    """
+    Векторизованный аналог Observer.calc_local_sidereal_time для массивов дат и долгот
+    :param dates: Последовательность дат (datetime.datetime или numpy.datetime64)
+    :param longitudes: Массив долгот в градусах (десятичный формат)
+    :return: Массив звёздных времён в градусах
+    """
+    dates = numpy.asarray(dates, dtype='datetime64[s]')
+    day_offset = star_handler.get_julian_dates(dates) - star_handler.J2000_JULIAN_DATE
+    hours = (dates - dates.astype('datetime64[D]')) / numpy.timedelta64(1, 'h')
+    return (100.46 + 0.985647 * day_offset + numpy.asarray(longitudes, dtype=float) + 15 * hours + 360) % 360
+
+
+def get_rotation_matrices(latitudes, longitudes, sidereal_times):
+    """
+    Векторизованный аналог Observer.calc_rotation_matrix: матрицы перехода от экваториальных
+    единичных векторов к горизонтальным для массива наблюдателей
+    :param latitudes: Массив широт в градусах
+    :param longitudes: Массив долгот в градусах
+    :param sidereal_times: Массив звёздных времён в градусах (см. get_local_sidereal_times)
+    :return: Массив матриц размера (M, 3, 3)
+    """
+    theta = numpy.radians(numpy.asarray(sidereal_times, dtype=float) + longitudes)
+    latitude = numpy.radians(numpy.asarray(latitudes, dtype=float))
+    sin_t, cos_t = numpy.sin(theta), numpy.cos(theta)
+    sin_l, cos_l = numpy.sin(latitude), numpy.cos(latitude)
+
+    matrices = numpy.zeros(theta.shape + (3, 3))
+    matrices[..., 0, 0], matrices[..., 0, 1], matrices[..., 0, 2] = sin_l * cos_t, sin_l * sin_t, -cos_l
+    matrices[..., 1, 0], matrices[..., 1, 1] = sin_t, -cos_t
+    matrices[..., 2, 0], matrices[..., 2, 1], matrices[..., 2, 2] = cos_l * cos_t, cos_l * sin_t, sin_l
+    return matrices
+
+
 def main():
     pass
 
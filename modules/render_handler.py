@@ -0,0 +1,282 @@
+import math
+import os
+import struct
+import zlib
+import numpy
+from . import star_handler
+from . import catalog_handler
+from . import coordinates_handler
+
+
+# Отрисовка звёздного неба без графического интерфейса (без tkinter и pygame).
+# Изображение - массив numpy размера (высота, ширина, 3) с компонентами RGB
+
+
+BACKGROUND_COLOR = (0, 0, 0)
+# количество звёзд, отрисовываемых за один шаг rasterize_arrays
+RASTER_BLOCK_SIZE = 4096
+
+
+def hex_to_rgb(color):
+    """
+    Перевод цвета из шестнадцатиричного формата в компоненты RGB
+    :param color: Строка вида '#RRGGBB'
+    :return: Кортеж (R, G, B)
+    """
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def create_image(width, height, background=BACKGROUND_COLOR):
+    """
+    Создание пустого изображения
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param background: Цвет фона (R, G, B)
+    :return: Массив numpy размера (height, width, 3)
+    """
+    image = numpy.empty((height, width, 3), dtype=numpy.uint8)
+    image[:, :] = background
+    return image
+
+
+def draw_disc(image, x, y, radius, color):
+    """
+    Отрисовка закрашенного круга. Закрашиваются пиксели, центры которых лежат внутри круга
+    :param image: Изображение
+    :param x: Координата X центра
+    :param y: Координата Y центра
+    :param radius: Радиус в пикселях
+    :param color: Цвет (R, G, B)
+    """
+    height, width = image.shape[:2]
+    left, right = max(int(math.floor(x - radius)), 0), min(int(math.ceil(x + radius)), width)
+    top, bottom = max(int(math.floor(y - radius)), 0), min(int(math.ceil(y + radius)), height)
+    if left >= right or top >= bottom:
+        return
+    columns = numpy.arange(left, right) + 0.5 - x
+    rows = numpy.arange(top, bottom) + 0.5 - y
+    mask = rows[:, None] ** 2 + columns[None, :] ** 2 <= radius ** 2
+    image[top:bottom, left:right][mask] = color
+
+
+def rasterize(image, xs, ys, radii, colors):
+    """
+    Отрисовка набора звёзд на изображении
+    :param image: Изображение
+    :param xs: Экранные координаты X
+    :param ys: Экранные координаты Y
+    :param radii: Радиусы звёзд
+    :param colors: Цвета звёзд в шестнадцатиричном формате
+    """
+    rgb_cache = {}
+    for x, y, radius, color in zip(xs, ys, radii, colors):
+        rgb = rgb_cache.get(color)
+        if rgb is None:
+            rgb = rgb_cache[color] = hex_to_rgb(color)
+        draw_disc(image, x, y, radius, rgb)
+
+
+def get_rgb_colors(colors):
+    """
+    Перевод списка цветов из шестнадцатиричного формата в массив компонент RGB
+    :param colors: Список строк вида '#RRGGBB'
+    :return: Массив numpy размера (N, 3)
+    """
+    if not len(colors):
+        return numpy.empty((0, 3), dtype=numpy.uint8)
+    palette, inverse = numpy.unique(colors, return_inverse=True)
+    return numpy.array([hex_to_rgb(color) for color in palette], dtype=numpy.uint8)[inverse.ravel()]
+
+
+def draw_discs(image, xs, ys, radius, colors):
+    """
+    Отрисовка блока кругов одного радиуса. Для каждого круга проверяется квадрат пикселей
+    со стороной ceil(2 * radius) + 1 вокруг центра, закрашиваются те же пиксели, что и в draw_disc
+    :param image: Изображение
+    :param xs: Массив координат X центров
+    :param ys: Массив координат Y центров
+    :param radius: Радиус в пикселях
+    :param colors: Массив цветов размера (N, 3)
+    """
+    height, width = image.shape[:2]
+    offsets = numpy.arange(int(math.ceil(2 * radius)) + 1)
+    columns = numpy.floor(xs - radius).astype(int)[:, None] + offsets
+    rows = numpy.floor(ys - radius).astype(int)[:, None] + offsets
+    mask = (((rows + 0.5 - ys[:, None]) ** 2)[:, :, None] +
+            ((columns + 0.5 - xs[:, None]) ** 2)[:, None, :] <= radius ** 2)
+    mask &= ((rows >= 0) & (rows < height))[:, :, None] & ((columns >= 0) & (columns < width))[:, None, :]
+    star, row, column = numpy.nonzero(mask)
+    image[rows[star, row], columns[star, column]] = colors[star]
+
+
+def rasterize_arrays(image, xs, ys, radii, colors):
+    """
+    Векторизованный аналог rasterize. Звёзды группируются по радиусу (радиусов немного,
+    см. star_handler.STAR_RADIUS_TABLE) и отрисовываются блоками не более RASTER_BLOCK_SIZE звёзд,
+    поэтому объём промежуточных массивов ограничен. Звёзды большего радиуса рисуются поверх меньших
+    :param image: Изображение
+    :param xs: Массив экранных координат X
+    :param ys: Массив экранных координат Y
+    :param radii: Массив радиусов звёзд
+    :param colors: Массив цветов размера (N, 3)
+    """
+    xs, ys, radii = (numpy.asarray(array, dtype=float) for array in (xs, ys, radii))
+    colors = numpy.asarray(colors)
+    for radius in numpy.unique(radii):
+        group = numpy.flatnonzero(radii == radius)
+        for first in range(0, len(group), RASTER_BLOCK_SIZE):
+            block = group[first:first + RASTER_BLOCK_SIZE]
+            draw_discs(image, xs[block], ys[block], float(radius), colors[block])
+
+
+def render_stars(stars, observer, fov=65, width=900, height=600, dist=5):
+    """
+    Отрисовка списка звёзд с помощью get_projected_stars
+    :param stars: Список звёзд, его элементы - объекты класса star_handler.Star
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param fov: Field of view в процентах
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param dist: Расстояние до плоскости (константа)
+    :return: Изображение
+    """
+    projected = star_handler.get_projected_stars(stars, observer, dist=dist, width=width, height=height, fov=fov)
+    image = create_image(width, height)
+    rasterize(image,
+              [star.projected_coordinates.x for star in projected],
+              [star.projected_coordinates.y for star in projected],
+              [star.get_star_radius() for star in projected],
+              [star.get_star_color() for star in projected])
+    return image
+
+
+def render_catalog(catalog, observer, fov=65, width=900, height=600, dist=5, sphere_index=None):
+    """
+    Отрисовка каталога звёзд с помощью векторизованной проекции (get_projected_arrays)
+    :param catalog: Каталог - объект класса catalog_handler.StarCatalog
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param fov: Field of view в процентах
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param dist: Расстояние до плоскости (константа)
+    :param sphere_index: Индекс экваториальных векторов каталога на эпоху даты наблюдения - проецируются только
+    звёзды конуса взгляда; None - проецируются все звёзды
+    :return: Изображение
+    """
+    equatorial_vectors = catalog.get_equatorial_vectors(observer.date)
+    magnitudes, stellar_classes = catalog['apparent_magnitude'], catalog['stellar_class']
+    if sphere_index is not None:
+        candidates = star_handler.get_view_candidates(sphere_index, observer, dist=dist, fov=fov)
+        equatorial_vectors = equatorial_vectors[candidates]
+        magnitudes, stellar_classes = magnitudes[candidates], stellar_classes[candidates]
+    vectors = star_handler.get_horizontal_vectors(equatorial_vectors, observer)
+    indices, xs, ys, radii = star_handler.get_projected_arrays(vectors, magnitudes, observer,
+                                                               dist=dist, width=width, height=height, fov=fov)
+    image = create_image(width, height)
+    colors = get_rgb_colors(star_handler.get_star_colors(stellar_classes[indices]))
+    rasterize_arrays(image, xs, ys, radii, colors)
+    return image
+
+
+def render_manager(manager, observer, fov=65, width=900, height=600, dist=5):
+    """
+    Отрисовка каталога, отслеживающего изменения файлов. Изменённые файлы разбираются заново (refresh),
+    звёзды конуса взгляда отбираются по индексу каталога, переведённому на эпоху даты наблюдения.
+    Каталог читается под блокировкой, поэтому refresh можно вызывать и из другого потока
+    :param manager: Каталог - объект класса catalog_handler.CatalogManager
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param fov: Field of view в процентах
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param dist: Расстояние до плоскости (константа)
+    :return: Изображение
+    """
+    manager.refresh()
+    manager.set_date(observer.date)
+    with manager.snapshot() as (catalog, sphere_index):
+        return render_catalog(catalog, observer, fov=fov, width=width, height=height, dist=dist,
+                              sphere_index=sphere_index)
+
+
+def encode_ppm(image):
+    """
+    Кодирование изображения в формат PPM (P6)
+    :param image: Изображение
+    :return: Байтовая строка
+    """
+    height, width = image.shape[:2]
+    return 'P6\n{} {}\n255\n'.format(width, height).encode('ascii') + image.tobytes()
+
+
+def encode_png(image):
+    """
+    Кодирование изображения в формат PNG (8 бит на канал, RGB, без фильтрации строк)
+    :param image: Изображение
+    :return: Байтовая строка
+    """
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    height, width = image.shape[:2]
+    rows = numpy.zeros((height, width * 3 + 1), dtype=numpy.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(rows.tobytes())) + chunk(b'IEND', b''))
+
+
+def save_image(image, path):
+    """
+    Сохранение изображения. Формат определяется по расширению файла: .ppm или .png
+    :param image: Изображение
+    :param path: Путь до файла
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.ppm':
+        data = encode_ppm(image)
+    elif extension == '.png':
+        data = encode_png(image)
+    else:
+        raise ValueError('Unsupported image format: {}'.format(extension))
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def create_observer(date, latitude, longitude, view):
+    """
+    Создание наблюдателя так же, как это делает форма конфигурации
+    :param date: Дата наблюдения - объект datetime.datetime
+    :param latitude: Широта в градусах (десятичный формат)
+    :param longitude: Долгота в градусах (десятичный формат)
+    :param view: Вектор взгляда - кортеж (x, y, z)
+    :return: Наблюдатель - объект класса coordinates_handler.Observer
+    """
+    vector = coordinates_handler.Vector(*map(float, view))
+    vector.normalize()
+    vector.x, vector.y, vector.z = map(math.acos, [vector.x, vector.y, vector.z])
+
+    observer = coordinates_handler.Observer()
+    observer.set_date(date)
+    observer.set_decimal_coordinates(latitude, longitude)
+    observer.set_view_vector(vector)
+    return observer
+
+
+def render_chart(path, observer, output, fov=65, width=900, height=600, bright='more 0', workers=1):
+    """
+    Построение карты звёздного неба и сохранение её в файл
+    :param path: Папка, описывающая небесную сферу
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param output: Путь до файла изображения (.png или .ppm)
+    :param fov: Field of view в процентах
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param bright: Фильтрация яркости
+    :param workers: Количество процессов для разбора каталога
+    :return: Список ошибок разбора каталога
+    """
+    catalog, errors = catalog_handler.load_catalog(path, workers=workers)
+    catalog = catalog_handler.filter_by_brightness(catalog, bright)
+    save_image(render_catalog(catalog, observer, fov=fov, width=width, height=height), output)
+    return errors
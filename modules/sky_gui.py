@@ -1,10 +1,25 @@
 import datetime
 import math
+import time
 import tkinter
+import numpy
 from tkinter import filedialog, messagebox
 from pygame import mixer
 from . import star_handler
+from . import catalog_handler
 from . import coordinates_handler
+from . import spatial_index
+from . import render_handler
+
+
+MAGNITUDE_STEP = 0.5
+ZOOM_FACTOR = 1.1
+MIN_FOV, MAX_FOV = 1, 100
+# запас (в градусах) вокруг конуса взгляда, в котором файлы созвездий загружаются заранее
+LAZY_MARGIN = 15
+LOAD_POLL_INTERVAL = 50
+# способы отрисовки звёзд: элемент холста на каждую звезду или одно изображение на кадр
+BACKENDS = ('items', 'image')
 
 
 class ConfigurationWindow(tkinter.Tk):
@@ -15,12 +30,20 @@ class ConfigurationWindow(tkinter.Tk):
     Координаты наблюдателя
     Вектор взгляда наблюдателя
     """
-    def __init__(self, canvas_width, canvas_height, fov, bright, music_path):
+    def __init__(self, canvas_width, canvas_height, fov, bright, music_path, fps=30, workers=1, frame_budget=20,
+                 time_speed=960, lazy=False, watch=0, backend='items'):
         super().__init__()
         self.canvas_width, self.canvas_height = canvas_width, canvas_height
         self.canvas_fov = fov
         self.bright = bright
         self.music_path = music_path
+        self.fps = fps
+        self.frame_budget = frame_budget
+        self.time_speed = time_speed
+        self.workers = workers
+        self.lazy = lazy
+        self.watch = watch
+        self.backend = backend
 
         self.geometry('350x428+300+200')
         self.resizable(width=False, height=False)
@@ -113,7 +136,9 @@ class ConfigurationWindow(tkinter.Tk):
                            latitude=latitude, vector=vector,
                            path=stars_path,
                            canvas_width=self.canvas_width, canvas_height=self.canvas_height,
-                           fov=self.canvas_fov, bright=self.bright, music_path=self.music_path)
+                           fov=self.canvas_fov, bright=self.bright, music_path=self.music_path,
+                           fps=self.fps, workers=self.workers, frame_budget=self.frame_budget,
+                           time_speed=self.time_speed, lazy=self.lazy, watch=self.watch, backend=self.backend)
 
 
 class PathFrame(tkinter.Frame):
@@ -253,33 +278,229 @@ class CanvasFrame(tkinter.Canvas):
     """
     Фрейм, отвечающий за отображение небесных тел
     """
-    def __init__(self, master, stars, observer, fov, music_path, **kwargs):
+    def __init__(self, master, catalog, observer, fov, music_path, pool_limit=5000, fps=30, bright='more 0',
+                 frame_budget=20, time_speed=960, loader=None, manager=None, watch_interval=1000, backend='items',
+                 **kwargs):
         super().__init__(master, **kwargs)
         self.width, self.height = self.winfo_reqwidth(), self.winfo_reqheight()
 
         self.fov = fov
 
-        self.stars = stars
-        self.displayed = {}
         self.observer = observer
+        self.bright_operand, self.bright_value = catalog_handler.parse_brightness(bright)
+        self.limit_text = None
+        self.frame_budget = frame_budget
+        # векторы звёзд в системе координат камеры для текущего вектора взгляда (используются при масштабировании)
+        self.camera_candidates = None
+        self.camera_vectors = None
+        self.camera_fov = None
+        # ленивая загрузка: каталог содержит только загруженные файлы созвездий (см. catalog_handler.LazyCatalog)
+        self.loader = loader
+        self.load_job = None
+        self.loader_errors = len(loader.errors) if loader is not None else 0
+        # отслеживание изменений файлов каталога (см. catalog_handler.CatalogManager)
+        self.manager = manager
+        self.source_ranges = dict(manager.ranges) if manager is not None else None
+        self.watch_interval = max(watch_interval, 1)
+        self.watch_job = None
+        # backend 'image': звёзды кадра растеризуются в одно изображение (см. render_handler),
+        # которое показывается единственным элементом холста
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend: {}'.format(backend))
+        self.backend = backend
+        self.frame_image = None
+        self.photo = None
+        self.image_item = None
+        if backend == 'image':
+            self.photo = tkinter.PhotoImage(master=self)
+            self.image_item = self.create_image(0, 0, anchor=tkinter.NW, image=self.photo)
+        self.pending_tiers = []
+        self.frame_visible = set()
+        self.frame_points = []
+        self.dragging = False
+        self.fill_job = None
+        # ускоренное течение времени: time_speed секунд наблюдения за секунду
+        self.time_speed = time_speed
+        self.animation_job = None
+        self.animation_time = None
+        self.date_text = None
+        self.items = {}
+        self.shown = set()
+        self.pool_limit = pool_limit
         self.music_paused = False
         mixer.init()
         mixer.music.load(music_path)
 
         self.text = None
+        self.hovered = None
+        self.screen_grid = spatial_index.ScreenGrid([], [], [])
+        self.set_catalog(catalog)
         self.current_x, self.current_y = None, None
+        self.pending_x, self.pending_y = 0, 0
+        self.frame_interval = max(int(1000 / fps), 1)
+        self.frame_job = None
 
         self.bind('<B1-Motion>', self.on_click)
+        self.bind('<ButtonRelease-1>', self.on_release)
         self.bind('<Configure>', self.on_resize)
         self.bind('<Motion>', self.motion)
         self.bind('<ButtonRelease-3>', self.pause_music)
+        self.bind('<MouseWheel>', lambda event: self.zoom(1 if event.delta > 0 else -1))
+        self.bind('<Button-4>', lambda event: self.zoom(1))
+        self.bind('<Button-5>', lambda event: self.zoom(-1))
+        for sequence in ('<plus>', '<equal>', '<KP_Add>'):
+            self.bind(sequence, lambda event: self.change_magnitude_limit(MAGNITUDE_STEP))
+        for sequence in ('<minus>', '<KP_Subtract>'):
+            self.bind(sequence, lambda event: self.change_magnitude_limit(-MAGNITUDE_STEP))
+        self.bind('<space>', self.toggle_animation)
+        self.focus_set()
+
+        self.draw_frame()
+        if self.manager is not None:
+            self.watch_job = self.after(self.watch_interval, self.watch_catalog)
+        mixer.music.play(-1)
 
-        projected = star_handler.get_projected_stars(self.stars, self.observer, dist=5,
-                                                     width=self.width, height=self.height,
-                                                     fov=self.fov)
+    def set_catalog(self, catalog):
+        """
+        Установка отображаемого каталога. Каталог упорядочивается по звёздной величине - звёзды,
+        проходящие фильтр яркости, образуют диапазон. Номера звёзд меняются, поэтому элементы холста удаляются
+        :param catalog: Каталог - объект класса catalog_handler.StarCatalog
+        """
+        order = catalog_handler.get_brightness_order(catalog)
+        # номер в отображаемом каталоге для каждой звезды исходного каталога (см. patch_stars)
+        self.source_positions = numpy.empty_like(order)
+        self.source_positions[order] = numpy.arange(len(order))
+        catalog = catalog_handler.select_stars(catalog, order)
+        self.catalog = catalog
+        self.equatorial_vectors = catalog.get_equatorial_vectors(self.observer.date)
+        self.vectors = star_handler.get_horizontal_vectors(self.equatorial_vectors, self.observer)
+        self.sphere_index = spatial_index.SphereIndex(self.equatorial_vectors)
+        self.magnitudes = catalog['apparent_magnitude']
+        self.colors = star_handler.get_star_colors(catalog['stellar_class'])
+        if self.backend == 'image':
+            self.rgb_colors = render_handler.get_rgb_colors(self.colors)
+        self.visible_range = catalog_handler.get_brightness_range(self.magnitudes, self.bright_operand,
+                                                                  self.bright_value)
+        # уровни яркости: во время перетаскивания рисуются только яркие уровни, укладывающиеся в frame_budget мс,
+        # остальные дорисовываются по одному после окончания перетаскивания
+        self.tiers = catalog_handler.get_magnitude_tiers(self.magnitudes)
+        self.camera_candidates = None
+        self.pending_tiers = []
+        self.delete('oval')
+        self.items = {}
+        self.shown = set()
+        self.hide_text()
+        self.screen_grid = spatial_index.ScreenGrid([], [], [])
+
+    def add_stars(self, catalog):
+        """
+        Добавление звёзд в отображаемый каталог без его замены. Новые звёзды вставляются в упорядоченный
+        по звёздной величине каталог, номера уже созданных элементов холста пересчитываются, поэтому
+        отображаемые звёзды не пропадают
+        :param catalog: Каталог новых звёзд - объект класса catalog_handler.StarCatalog
+        """
+        count = len(self.catalog)
+        merged = catalog_handler.merge_catalogs([self.catalog, catalog])
+        order = numpy.argsort(merged['apparent_magnitude'], kind='stable')
+        # новый номер каждой звезды прежнего каталога
+        positions = numpy.empty(len(order), dtype=int)
+        positions[order] = numpy.arange(len(order))
+        positions = positions[:count].tolist()
+
+        colors = self.colors + star_handler.get_star_colors(catalog['stellar_class'])
+        self.catalog = catalog_handler.select_stars(merged, order)
+        self.equatorial_vectors = self.catalog.get_equatorial_vectors(self.observer.date)
+        self.vectors = star_handler.get_horizontal_vectors(self.equatorial_vectors, self.observer)
+        self.sphere_index = spatial_index.SphereIndex(self.equatorial_vectors)
+        self.magnitudes = self.catalog['apparent_magnitude']
+        self.colors = [colors[index] for index in order.tolist()]
+        if self.backend == 'image':
+            self.rgb_colors = render_handler.get_rgb_colors(self.colors)
+        self.visible_range = catalog_handler.get_brightness_range(self.magnitudes, self.bright_operand,
+                                                                  self.bright_value)
+        self.tiers = catalog_handler.get_magnitude_tiers(self.magnitudes)
+        self.camera_candidates = None
+        self.pending_tiers = []
+        self.items = {positions[index]: item for index, item in self.items.items()}
+        self.shown = {positions[index] for index in self.shown}
+        self.hide_text()
+        self.screen_grid = spatial_index.ScreenGrid([], [], [])
+
+    def request_stars(self):
+        """
+        Запуск фоновой загрузки файлов созвездий, пересекающихся с конусом взгляда (с запасом LAZY_MARGIN)
+        """
+        radius = star_handler.get_view_radius(5, self.fov) + LAZY_MARGIN
+        if self.loader.request(star_handler.get_view_direction(self.observer), radius) and self.load_job is None:
+            self.load_job = self.after(LOAD_POLL_INTERVAL, self.poll_loader)
 
-        self.draw_stars(projected)
-        mixer.music.play(-1)
+    def poll_loader(self):
+        """
+        Проверка фоновой загрузки. Все файлы, загруженные к моменту проверки, добавляются в каталог
+        за один раз, кадр перерисовывается. Ошибки разбора новых файлов показываются пользователю
+        """
+        self.load_job = None
+        filenames = self.loader.collect()
+        if filenames:
+            self.add_stars(catalog_handler.merge_catalogs([self.loader.catalogs[filename] for filename in filenames]))
+            self.schedule_frame()
+        if len(self.loader.errors) > self.loader_errors:
+            show_catalog_errors(self.loader.errors[self.loader_errors:], self)
+            self.loader_errors = len(self.loader.errors)
+        if self.loader.pending:
+            self.load_job = self.after(LOAD_POLL_INTERVAL, self.poll_loader)
+
+    def watch_catalog(self):
+        """
+        Периодическая проверка файлов каталога. Разбираются только изменённые файлы, их звёзды заменяются
+        на месте (см. patch_stars). Каталог устанавливается заново, только если изменилось количество звёзд
+        в файлах или нарушился порядок по яркости
+        """
+        try:
+            filenames = self.manager.refresh()
+            if filenames:
+                with self.manager.snapshot() as (catalog, _):
+                    if self.manager.ranges != self.source_ranges or not self.patch_stars(filenames):
+                        self.set_catalog(catalog)
+                        self.source_ranges = dict(self.manager.ranges)
+                self.schedule_frame()
+        finally:
+            self.watch_job = self.after(self.watch_interval, self.watch_catalog)
+
+    def patch_stars(self, filenames):
+        """
+        Замена звёзд изменённых файлов в отображаемом каталоге на месте: колонки, векторы, индекс
+        и цвета обновляются только для звёзд этих файлов, элементы холста сохраняются
+        :param filenames: Список путей до изменённых файлов (диапазоны номеров их звёзд не изменились)
+        :return: False, если новые звёздные величины нарушают порядок по яркости - звёзды не заменены
+        """
+        catalogs = [self.manager.files[filename]['catalog'] for filename in filenames]
+        catalog = catalog_handler.merge_catalogs(catalogs)
+        sources = [numpy.arange(*self.source_ranges[filename]) for filename in filenames]
+        positions = self.source_positions[numpy.concatenate(sources)]
+        magnitudes = self.magnitudes.copy()
+        magnitudes[positions] = catalog['apparent_magnitude']
+        if (numpy.diff(magnitudes) < 0).any():
+            return False
+
+        # update пересчитывает закэшированные векторы эпохи - это массив self.equatorial_vectors
+        self.catalog.update(positions, catalog)
+        self.sphere_index.update(positions, self.equatorial_vectors[positions])
+        self.vectors[positions] = star_handler.get_horizontal_vectors(self.equatorial_vectors[positions],
+                                                                      self.observer)
+        colors = star_handler.get_star_colors(catalog['stellar_class'])
+        for position, color in zip(positions.tolist(), colors):
+            self.colors[position] = color
+            if position in self.items:
+                self.itemconfigure(self.items[position], fill=color)
+        if self.backend == 'image':
+            self.rgb_colors[positions] = render_handler.get_rgb_colors(colors)
+        self.visible_range = catalog_handler.get_brightness_range(self.magnitudes, self.bright_operand,
+                                                                  self.bright_value)
+        self.tiers = catalog_handler.get_magnitude_tiers(self.magnitudes)
+        self.camera_candidates = None
+        self.hide_text()
+        return True
 
     def pause_music(self, event):
         if self.music_paused:
@@ -290,63 +511,160 @@ class CanvasFrame(tkinter.Canvas):
             self.music_paused = True
 
     def on_resize(self, event):
-        # determine the ratio of old width/height to new width/height
-        wscale = float(event.width) / self.width
-        hscale = float(event.height) / self.height
+        """
+        Изменение размеров холста - звёзды перепроецируются в следующем кадре
+        :param event: Событие
+        """
         self.width = event.width
         self.height = event.height
         # resize the canvas
         self.config(width=self.width, height=self.height)
-        # rescale all the objects
-        self.scale(tkinter.ALL, 0, 0, wscale, hscale)
+        if self.limit_text is not None:
+            self.show_magnitude_limit()
+        if self.date_text is not None:
+            self.show_date()
+        self.schedule_frame()
+
+    def change_magnitude_limit(self, delta):
+        """
+        Изменение звёздной величины фильтра яркости без перезагрузки каталога.
+        Новый диапазон видимых звёзд находится двоичным поиском по упорядоченному каталогу
+        :param delta: Изменение звёздной величины
+        """
+        self.bright_value = min(max(self.bright_value + delta, 0), 99)
+        self.visible_range = catalog_handler.get_brightness_range(self.magnitudes, self.bright_operand,
+                                                                  self.bright_value)
+        self.show_magnitude_limit()
+        self.schedule_frame()
+
+    def zoom(self, steps):
+        """
+        Изменение field of view. Вектор взгляда не меняется, поэтому в следующем кадре
+        повторно используются уже повёрнутые векторы звёзд (см. update_camera)
+        :param steps: Количество шагов приближения (отрицательное - отдаление)
+        """
+        self.fov = min(max(self.fov / ZOOM_FACTOR ** steps, MIN_FOV), MAX_FOV)
+        self.schedule_frame()
+
+    def show_magnitude_limit(self):
+        """
+        Отображение текущего фильтра яркости в левом нижнем углу холста
+        """
+        if self.limit_text is not None:
+            self.delete(self.limit_text)
+        self.limit_text = self.create_text(5, self.height - 5, anchor=tkinter.SW, state=tkinter.DISABLED,
+                                           text='Magnitude {} {:g}'.format(self.bright_operand, self.bright_value),
+                                           fill='white')
+
+    def toggle_animation(self, event=None):
+        """
+        Запуск или остановка ускоренного течения времени
+        :param event: Событие
+        """
+        if self.animation_job is None:
+            self.animation_time = time.perf_counter()
+            self.animation_job = self.after(self.frame_interval, self.animate)
+            return
+        self.after_cancel(self.animation_job)
+        self.animation_job = None
+        # накопленная погрешность поворотов устраняется точным пересчётом векторов
+        self.observer.calibrate_sidereal_time()
+        self.update_observer()
+
+    def animate(self):
+        """
+        Кадр ускоренного течения времени. Сдвиг даты определяется по реально прошедшему времени,
+        поэтому скорость анимации не зависит от задержек отрисовки. Смена даты - поворот неба
+        вокруг оси мира, он применяется к закэшированным горизонтальным векторам звёзд
+        """
+        now = time.perf_counter()
+        rotation = self.observer.advance_time((now - self.animation_time) * self.time_speed)
+        self.animation_time = now
+        self.vectors = self.vectors @ rotation.T
+        self.camera_candidates = None
+        self.draw_frame()
+        self.show_date()
+
+        spent = int((time.perf_counter() - now) * 1000)
+        self.animation_job = self.after(max(self.frame_interval - spent, 1), self.animate)
+
+    def show_date(self):
+        """
+        Отображение даты наблюдения в правом нижнем углу холста
+        """
+        if self.date_text is not None:
+            self.delete(self.date_text)
+        self.date_text = self.create_text(self.width - 5, self.height - 5, anchor=tkinter.SE, state=tkinter.DISABLED,
+                                          text=self.observer.date.strftime('%Y-%m-%d %H:%M UTC'), fill='white')
 
     def on_click(self, event):
         """
-        Определяется сдвиг и происходит перерисовка формы
+        Определяется сдвиг относительно предыдущего события, который накапливается до отрисовки следующего кадра
         :param event: Событие
         """
-        if self.current_x is None:
-            self.current_x = event.x
-            self.current_y = event.y
-        else:
-            delta_x = event.x - self.current_x
-            delta_y = event.y - self.current_y
-            self.get_projected(delta_x, delta_y)
-            self.current_x, self.current_y = None, None
+        self.dragging = True
+        if self.current_x is not None:
+            self.pending_x += event.x - self.current_x
+            self.pending_y += event.y - self.current_y
+            self.schedule_frame()
+        self.current_x, self.current_y = event.x, event.y
+
+    def on_release(self, event):
+        """
+        Окончание перетаскивания - запускается дорисовка пропущенных уровней яркости
+        :param event: Событие
+        """
+        self.dragging = False
+        self.current_x, self.current_y = None, None
+        self.schedule_fill()
+
+    def schedule_frame(self):
+        """
+        Планирование отрисовки кадра. Пока кадр не отрисован, новые события
+        только накапливают сдвиг, поэтому отрисовка происходит не чаще frame_interval
+        """
+        if self.frame_job is None:
+            self.frame_job = self.after(self.frame_interval, self.render_frame)
+
+    def render_frame(self):
+        """
+        Отрисовка кадра с учётом накопленного сдвига
+        """
+        self.frame_job = None
+        delta_x, delta_y = self.pending_x, self.pending_y
+        self.pending_x, self.pending_y = 0, 0
+        self.get_projected(delta_x, delta_y)
 
     def motion(self, event):
+        """
+        Показ информации о звезде под курсором. Звезда ищется по сетке,
+        построенной при отрисовке кадра; подсказка пересоздаётся только при смене звезды
+        :param event: Событие
+        """
         position = event.x, event.y
-        item = self.find_closest(*position, start='oval')
-        try:
-            item = item[0]
-        except IndexError:
+        hovered = self.screen_grid.query(*position)
+        if hovered == self.hovered:
             return
-        coords = self.coords(item)
-        center = None
-        try:
-            center = (coords[0] + coords[2]) / 2, (coords[1] + coords[3]) / 2
-        except IndexError:
+        self.hide_text()
+        self.hovered = hovered
+        if hovered is None:
             return
-        if all(abs(x[0] - x[1]) < 3 for x in zip(position, center)):
-            if self.text is None:
-                place = self.find_place(position)
-                if place == 'sw':
-                    dx, dy = 10, -10
-                elif place == 'nw':
-                    dx, dy = 10, 10
-                elif place == 'se':
-                    dx, dy = -10, -10
-                elif place == 'ne':
-                    dx, dy = -10, 10
-                else:
-                    self.text = self.create_text(5, 5, state=tkinter.DISABLED, anchor=tkinter.NW,
-                                                 text=self.displayed[item].info, fill='white')
-                    return
-                self.text = self.create_text(position[0] + dx, position[1] + dy, anchor=place, state=tkinter.DISABLED,
-                                             text=self.displayed[item].info, fill='white')
+
+        place = self.find_place(position)
+        if place == 'sw':
+            dx, dy = 10, -10
+        elif place == 'nw':
+            dx, dy = 10, 10
+        elif place == 'se':
+            dx, dy = -10, -10
+        elif place == 'ne':
+            dx, dy = -10, 10
         else:
-            self.delete(self.text)
-            self.text = None
+            self.text = self.create_text(5, 5, state=tkinter.DISABLED, anchor=tkinter.NW,
+                                         text=self.get_star_info(hovered), fill='white')
+            return
+        self.text = self.create_text(position[0] + dx, position[1] + dy, anchor=place, state=tkinter.DISABLED,
+                                     text=self.get_star_info(hovered), fill='white')
 
     def find_place(self, coords, dx=275, dy=75):
         result = ''
@@ -363,46 +681,206 @@ class CanvasFrame(tkinter.Canvas):
             return result
         return ''
 
+    def update_observer(self):
+        """
+        Пересчёт горизонтальных векторов звёзд после изменения даты или положения наблюдателя.
+        Экваториальные векторы пересчитываются (вместе с индексом) только при смене эпохи
+        """
+        equatorial_vectors = self.catalog.get_equatorial_vectors(self.observer.date)
+        if equatorial_vectors is not self.equatorial_vectors:
+            self.equatorial_vectors = equatorial_vectors
+            self.sphere_index = spatial_index.SphereIndex(equatorial_vectors)
+        self.vectors = star_handler.get_horizontal_vectors(self.equatorial_vectors, self.observer)
+        self.camera_candidates = None
+        self.schedule_frame()
+
     def get_projected(self, delta_x, delta_y):
         """
         Высчитываются новые координаты с учетом сдвига небесной сферы
         :param delta_x: Сдвиг по оси X
         :param delta_y: Сдвиг по оси Y
         """
-        divider_x = abs(10000 * self.observer.view_vector.x) + 1
-        divider_y = abs(10000 * self.observer.view_vector.y) + 1
-        self.observer.view_vector = self.observer.view_vector + coordinates_handler.Vector(delta_x / divider_x,
-                                                                                           -delta_y / divider_y,
-                                                                                           0)
+        if delta_x or delta_y:
+            divider_x = abs(10000 * self.observer.view_vector.x) + 1
+            divider_y = abs(10000 * self.observer.view_vector.y) + 1
+            self.observer.view_vector = self.observer.view_vector + coordinates_handler.Vector(delta_x / divider_x,
+                                                                                               -delta_y / divider_y,
+                                                                                               0)
+            self.camera_candidates = None
+
+        self.draw_frame()
+
+    def update_camera(self):
+        """
+        Подготовка векторов звёзд в системе координат камеры.
+        Звёзды конуса взгляда поворачиваются только после изменения вектора взгляда или отдаления.
+        При приближении видимые звёзды - подмножество видимых ранее, поэтому сохранённые векторы
+        только отсекаются по новому field of view
+        """
+        if self.camera_candidates is not None and self.camera_fov >= self.fov:
+            if self.camera_fov > self.fov:
+                visible, _, _ = star_handler.get_screen_arrays(self.camera_vectors, 5, self.fov)
+                self.camera_candidates = self.camera_candidates[visible]
+                self.camera_vectors = self.camera_vectors[visible]
+                self.camera_fov = self.fov
+            return
+        self.camera_candidates = star_handler.get_view_candidates(self.sphere_index, self.observer, dist=5,
+                                                                  fov=self.fov)
+        self.camera_vectors = star_handler.get_camera_vectors(self.vectors, self.observer, self.camera_candidates)
+        self.camera_fov = self.fov
+        if self.loader is not None:
+            self.request_stars()
+
+    def draw_frame(self):
+        """
+        Отрисовка кадра по уровням яркости, начиная с самых ярких звёзд.
+        Во время перетаскивания и анимации кадр ограничен frame_budget миллисекундами - оставшиеся уровни
+        дорисовываются по одному после их окончания (см. on_release, toggle_animation)
+        """
+        if self.fill_job is not None:
+            self.after_cancel(self.fill_job)
+            self.fill_job = None
+        self.hide_text()
+
+        first, last = self.visible_range
+        self.update_camera()
+        self.pending_tiers = [(max(tier_first, first), min(tier_last, last)) for tier_first, tier_last in self.tiers
+                              if tier_first < last and tier_last > first]
+        self.frame_visible = set()
+        self.frame_points = []
+        if self.backend == 'image':
+            self.frame_image = render_handler.create_image(self.width, self.height)
+
+        start = time.perf_counter()
+        while self.pending_tiers:
+            self.draw_tier(*self.pending_tiers.pop(0))
+            if self.is_interacting() and (time.perf_counter() - start) * 1000 >= self.frame_budget:
+                break
+        self.finish_frame()
+
+    def is_interacting(self):
+        """
+        :return: True, если небо перетаскивается или анимируется - кадр ограничен frame_budget
+        """
+        return self.dragging or self.animation_job is not None
+
+    def schedule_fill(self):
+        """
+        Планирование дорисовки следующего уровня яркости текущего кадра
+        """
+        if self.pending_tiers and self.fill_job is None:
+            self.fill_job = self.after(1, self.fill_tier)
+
+    def fill_tier(self):
+        """
+        Дорисовка следующего уровня яркости текущего кадра
+        """
+        self.fill_job = None
+        if self.is_interacting() or not self.pending_tiers:
+            return
+        self.draw_tier(*self.pending_tiers.pop(0))
+        self.finish_frame()
+        self.schedule_fill()
+
+    def draw_tier(self, first, last):
+        """
+        Проекция и отрисовка звёзд кадра, номера которых лежат в диапазоне [first, last)
+        :param first: Номер первой звезды уровня
+        :param last: Номер последней звезды уровня + 1
+        """
+        start = numpy.searchsorted(self.camera_candidates, first)
+        stop = numpy.searchsorted(self.camera_candidates, last)
+        indices, xs, ys, radii = star_handler.project_camera_vectors(
+            self.camera_vectors[start:stop], self.camera_candidates[start:stop], self.magnitudes, dist=5,
+            width=self.width, height=self.height, fov=self.fov)
+        self.place_stars(indices, xs, ys, radii)
+        self.frame_points.append((indices, xs, ys))
+
+    def place_stars(self, indices, xs, ys, radii):
+        """
+        Размещение спроецированных звёзд на холсте.
+        Для каждой звезды создаётся один элемент холста, который затем только перемещается
+        :param indices: Массив номеров видимых звёзд в каталоге
+        :param xs: Массив экранных координат X
+        :param ys: Массив экранных координат Y
+        :param radii: Массив радиусов звёзд
+        """
+        if self.backend == 'image':
+            # звёзды растеризуются в изображение кадра, на холст оно выводится в finish_frame
+            self.frame_visible.update(indices.tolist())
+            render_handler.rasterize_arrays(self.frame_image, xs, ys, radii, self.rgb_colors[indices])
+            return
+        for index, x, y, radius in zip(indices.tolist(), xs.tolist(), ys.tolist(), radii.tolist()):
+            self.frame_visible.add(index)
+            oval = self.items.get(index)
+            if oval is None:
+                oval = self.create_oval(x - radius, y - radius, x + radius, y + radius,
+                                        fill=self.colors[index], tag='oval')
+                self.items[index] = oval
+            else:
+                self.coords(oval, x - radius, y - radius, x + radius, y + radius)
+                if index not in self.shown:
+                    self.itemconfigure(oval, state=tkinter.NORMAL)
+
+    def finish_frame(self):
+        """
+        Завершение отрисовки: звёзды, не попавшие в кадр, скрываются (или изображение кадра выводится
+        на холст), строится сетка для поиска звезды под курсором. Холст обновляется один раз
+        """
+        if self.backend == 'image':
+            self.photo.configure(data=render_handler.encode_ppm(self.frame_image), format='PPM')
+        else:
+            for index in self.shown - self.frame_visible:
+                self.itemconfigure(self.items[index], state=tkinter.HIDDEN)
+        self.shown = set(self.frame_visible)
+        if self.frame_points:
+            self.screen_grid = spatial_index.ScreenGrid(*[numpy.concatenate(arrays)
+                                                          for arrays in zip(*self.frame_points)])
+        else:
+            self.screen_grid = spatial_index.ScreenGrid([], [], [])
+
+        if len(self.items) - len(self.shown) > self.pool_limit:
+            self.release_hidden()
+        self.update_idletasks()
+
+    def release_hidden(self):
+        """
+        Удаление скрытых элементов холста, чтобы пул не рос неограниченно при обзоре всего неба
+        """
+        for index in [index for index in self.items if index not in self.shown]:
+            self.delete(self.items.pop(index))
 
-        projected = star_handler.get_projected_stars(self.stars, self.observer, dist=5,
-                                                     width=self.winfo_reqwidth(),
-                                                     height=self.winfo_reqheight(),
-                                                     fov=self.fov)
-        self.draw_stars(projected)
+    def hide_text(self):
+        if self.text is not None:
+            self.delete(self.text)
+            self.text = None
+        self.hovered = None
 
-    def draw_stars(self, projected):
+    def get_star_info(self, index):
         """
-        Отрисовка списка звёзд
-        :param projected: Список, содержащий спроецированные координаты звёзд
+        Получение строки с информацией о звезде каталога
+        :param index: Номер звезды в каталоге
+        :return: Строка, описывающая звезду
         """
-        self.delete(tkinter.ALL)
-        self.displayed.clear()
+        return self.catalog.view(index).info
 
-        for star in projected:
-            color = star.get_star_color()
-            radius = star.get_star_radius()
-            x = star.projected_coordinates.x
-            y = star.projected_coordinates.y
-            oval = self.create_oval(x - radius, y - radius, x + radius, y + radius, fill=color, tag='oval')
-            self.update()
-            self.displayed[oval] = star
+
+def show_catalog_errors(errors, parent):
+    """
+    Предупреждение о строках каталога, пропущенных из-за ошибок разбора
+    :param errors: Список ошибок
+    :param parent: Родительское окно
+    """
+    messagebox.showwarning('Catalog errors', '{} lines were skipped:\r\n{}'.format(len(errors),
+                                                                                '\r\n'.join(errors[:10])),
+                           parent=parent)
 
 
 def calibrate_observer(date=None, longitude=None, latitude=None,
                        vector=None, path=None, canvas_width=None,
                        canvas_height=None, fov=None, bright=None,
-                       music_path=None):
+                       music_path=None, fps=30, workers=1, frame_budget=20, time_speed=960, lazy=False, watch=0,
+                       backend='items'):
     """
     Установка параметров наблюдателя
     :param date: Дата наблюдения
@@ -415,6 +893,13 @@ def calibrate_observer(date=None, longitude=None, latitude=None,
     :param fov: Field of view в процентах
     :param bright: Фильтрация яркости
     :param music_path: Путь до проигрываемого файла (музыка)
+    :param fps: Целевая частота кадров при перерисовке
+    :param workers: Количество процессов для разбора каталога
+    :param frame_budget: Время на отрисовку кадра во время перетаскивания (мс)
+    :param time_speed: Ускорение времени в режиме анимации
+    :param lazy: Загружать только файлы созвездий, попадающие в поле зрения
+    :param watch: Период проверки изменений файлов каталога в секундах, 0 - не проверять
+    :param backend: Способ отрисовки звёзд (см. BACKENDS)
     """
     observer = coordinates_handler.Observer()
     observer.set_date(date)
@@ -422,10 +907,13 @@ def calibrate_observer(date=None, longitude=None, latitude=None,
     observer.set_view_vector(vector)
     observer.calibrate_sidereal_time()
 
-    initiate_view_form(observer, path, canvas_width, canvas_height, fov, bright, music_path)
+    initiate_view_form(observer, path, canvas_width, canvas_height, fov, bright, music_path, fps=fps,
+                       workers=workers, frame_budget=frame_budget, time_speed=time_speed, lazy=lazy, watch=watch,
+                       backend=backend)
 
 
-def initiate_view_form(observer, path, canvas_width, canvas_height, fov, bright, music_path):
+def initiate_view_form(observer, path, canvas_width, canvas_height, fov, bright, music_path, fps=30, workers=1,
+                       frame_budget=20, time_speed=960, lazy=False, watch=0, backend='items'):
     """
     Создание формы, на которую будут отрисовываться звёзды
     :param observer: Наблюдатель - объект класса coordinates_handler.Observer
@@ -435,29 +923,35 @@ def initiate_view_form(observer, path, canvas_width, canvas_height, fov, bright,
     :param fov: Field of view в процентах
     :param bright: Фильтрация яркости
     :param music_path: Путь до проигрываемого файла (музыка)
+    :param fps: Целевая частота кадров при перерисовке
+    :param workers: Количество процессов для разбора каталога
+    :param frame_budget: Время на отрисовку кадра во время перетаскивания (мс)
+    :param time_speed: Ускорение времени в режиме анимации
+    :param lazy: Загружать только файлы созвездий, попадающие в поле зрения, остальные - в фоне при перемещении взгляда
+    :param watch: Период проверки изменений файлов каталога в секундах, 0 - не проверять (не используется с lazy)
+    :param backend: Способ отрисовки звёзд (см. BACKENDS)
     """
-    stars_collection = star_handler.star_generator(path)
-    stars = []
-
-    bright_operand, bright_value = bright.split()
-    bright_value = float(bright_value)
-
-    for star_info in stars_collection:
-        try:
-            new_star = star_handler.Star(star_info, observer)
-        except ValueError:
-            continue
-        else:
-            if bright_operand == 'more':  # The brighter an object appears, the lower its magnitude value
-                if new_star.apparent_magnitude >= bright_value:
-                    stars.append(new_star)
-            else:
-                if new_star.apparent_magnitude <= bright_value:
-                    stars.append(new_star)
+    loader, manager = None, None
+    if lazy:
+        loader = catalog_handler.LazyCatalog(path)
+        loader.load_files(loader.get_missing_files(star_handler.get_view_direction(observer),
+                                                   star_handler.get_view_radius(5, fov) + LAZY_MARGIN))
+        catalog, errors = loader.get_catalog(), list(loader.errors)
+    elif watch:
+        manager = catalog_handler.CatalogManager(path, workers=workers, date=observer.date)
+        catalog, errors = manager.catalog, manager.errors
+    else:
+        catalog, errors = catalog_handler.load_catalog(path, workers=workers)
     master = tkinter.Tk()
-    canvas = CanvasFrame(master, stars, observer, fov, music_path,
+    if errors:
+        show_catalog_errors(errors, master)
+    canvas = CanvasFrame(master, catalog, observer, fov, music_path, fps=fps, bright=bright, frame_budget=frame_budget,
+                         time_speed=time_speed, loader=loader, manager=manager, watch_interval=int(watch * 1000),
+                         backend=backend,
                          width=canvas_width, height=canvas_height,
                          bg='black', highlightthickness=0)
     canvas.pack(fill=tkinter.BOTH, expand=tkinter.YES)
 
     master.mainloop()
+    if loader is not None:
+        loader.close()
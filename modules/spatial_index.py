@@ -0,0 +1,169 @@
+import math
+import numpy
+
+
+class SphereIndex:
+    """
+    Индекс направлений на небесной сфере.
+    Сфера разбивается на ячейки сеткой по склонению и прямому восхождению (cell_size градусов),
+    номера звёзд хранятся упорядоченными по ячейкам, поэтому каждая ячейка - непрерывный срез.
+    Запрос "звёзды в пределах углового радиуса от направления" просматривает только ячейки,
+    пересекающиеся с конусом, и затем отбрасывает лишние звёзды по скалярному произведению
+    """
+    def __init__(self, vectors, cell_size=5):
+        """
+        :param vectors: Массив единичных векторов размера (N, 3)
+        :param cell_size: Размер ячейки в градусах
+        """
+        self.vectors = numpy.asarray(vectors, dtype=float)
+        self.cell_size = cell_size
+        self.bands = int(math.ceil(180 / cell_size))
+        self.sectors = int(math.ceil(360 / cell_size))
+
+        self.cells = self.get_cells(self.vectors)
+        self.sort_cells()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def sort_cells(self):
+        """
+        Упорядочивание номеров звёзд по ячейкам
+        """
+        self.order = numpy.argsort(self.cells, kind='stable')
+        self.offsets = numpy.searchsorted(self.cells[self.order], numpy.arange(self.bands * self.sectors + 1))
+
+    def update(self, positions, vectors):
+        """
+        Замена векторов звёзд на месте. Если звёзды остались в своих ячейках, упорядочивание не меняется
+        :param positions: Массив номеров звёзд
+        :param vectors: Массив новых единичных векторов размера (len(positions), 3)
+        """
+        vectors = numpy.asarray(vectors, dtype=float)
+        cells = self.get_cells(vectors)
+        self.vectors[positions] = vectors
+        if (cells != self.cells[positions]).any():
+            self.cells[positions] = cells
+            self.sort_cells()
+
+    def get_cells(self, vectors):
+        """
+        Вычисление номеров ячеек для массива векторов
+        :param vectors: Массив единичных векторов размера (N, 3)
+        :return: Массив номеров ячеек
+        """
+        declination = numpy.degrees(numpy.arcsin(numpy.clip(vectors[:, 2], -1, 1)))
+        right_ascension = numpy.degrees(numpy.arctan2(vectors[:, 1], vectors[:, 0])) % 360
+        band = numpy.minimum(((declination + 90) // self.cell_size).astype(int), self.bands - 1)
+        sector = numpy.minimum((right_ascension // self.cell_size).astype(int), self.sectors - 1)
+        return band * self.sectors + sector
+
+    def get_cell_ranges(self, declination, right_ascension, radius):
+        """
+        Вычисление диапазонов ячеек, пересекающихся с конусом
+        :param declination: Склонение оси конуса в градусах
+        :param right_ascension: Прямое восхождение оси конуса в градусах
+        :param radius: Угловой радиус конуса в градусах
+        :return: Список пар (первая ячейка, последняя ячейка + 1)
+        """
+        first_band = max(int((declination - radius + 90) // self.cell_size), 0)
+        last_band = min(int((declination + radius + 90) // self.cell_size), self.bands - 1)
+
+        if declination + radius >= 90 or declination - radius <= -90:
+            # конус содержит полюс - просматриваются все ячейки полос
+            return [(first_band * self.sectors, (last_band + 1) * self.sectors)]
+
+        half_width = math.degrees(math.asin(min(math.sin(math.radians(radius)) /
+                                                math.cos(math.radians(declination)), 1)))
+        first_sector = int((right_ascension - half_width) // self.cell_size)
+        last_sector = int((right_ascension + half_width) // self.cell_size)
+        if last_sector - first_sector + 1 >= self.sectors:
+            return [(first_band * self.sectors, (last_band + 1) * self.sectors)]
+
+        sector_ranges = []
+        if first_sector < 0:
+            sector_ranges.append((first_sector + self.sectors, self.sectors))
+            first_sector = 0
+        if last_sector >= self.sectors:
+            sector_ranges.append((0, last_sector - self.sectors + 1))
+            last_sector = self.sectors - 1
+        sector_ranges.append((first_sector, last_sector + 1))
+
+        return [(band * self.sectors + start, band * self.sectors + stop)
+                for band in range(first_band, last_band + 1)
+                for start, stop in sector_ranges]
+
+    def query(self, direction, radius):
+        """
+        Поиск звёзд, находящихся в пределах углового радиуса от заданного направления
+        :param direction: Вектор направления (не обязательно единичный)
+        :param radius: Угловой радиус в градусах
+        :return: Отсортированный массив номеров звёзд
+        """
+        direction = numpy.asarray(direction, dtype=float)
+        direction = direction / numpy.linalg.norm(direction)
+        declination = math.degrees(math.asin(max(-1.0, min(1.0, direction[2]))))
+        right_ascension = math.degrees(math.atan2(direction[1], direction[0])) % 360
+
+        candidates = [self.order[self.offsets[start]:self.offsets[stop]]
+                      for start, stop in self.get_cell_ranges(declination, right_ascension, radius)]
+        if not candidates:
+            return numpy.empty(0, dtype=int)
+        candidates = numpy.concatenate(candidates)
+        inside = self.vectors[candidates] @ direction >= math.cos(math.radians(radius))
+        return numpy.sort(candidates[inside])
+
+
+class ScreenGrid:
+    """
+    Равномерная сетка спроецированных позиций звёзд на экране.
+    Позиции упорядочиваются по номеру ячейки, поэтому поиск звезды рядом с курсором
+    просматривает только соседние ячейки и не зависит от количества звёзд на экране
+    """
+    def __init__(self, indices, xs, ys, cell_size=8):
+        """
+        :param indices: Массив номеров звёзд
+        :param xs: Массив экранных координат X
+        :param ys: Массив экранных координат Y
+        :param cell_size: Размер ячейки в пикселях
+        """
+        self.cell_size = cell_size
+        keys = self.get_keys(numpy.asarray(xs) // cell_size, numpy.asarray(ys) // cell_size)
+        order = numpy.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.indices = numpy.asarray(indices)[order]
+        self.xs = numpy.asarray(xs)[order]
+        self.ys = numpy.asarray(ys)[order]
+
+    def __len__(self):
+        return len(self.indices)
+
+    @staticmethod
+    def get_keys(cells_x, cells_y):
+        # ключ ячейки - пара номеров, упакованная в одно целое число
+        return (numpy.asarray(cells_x, dtype=numpy.int64) << 32) + numpy.asarray(cells_y, dtype=numpy.int64)
+
+    def query(self, x, y, tolerance=3):
+        """
+        Поиск ближайшей к точке звезды, отстоящей от неё меньше чем на tolerance по каждой из осей
+        :param x: Экранная координата X
+        :param y: Экранная координата Y
+        :param tolerance: Допустимое отклонение в пикселях
+        :return: Номер звезды или None
+        """
+        cells = range(-((tolerance - 1) // self.cell_size) - 1, (tolerance - 1) // self.cell_size + 2)
+        cell_x, cell_y = int(x // self.cell_size), int(y // self.cell_size)
+        best, best_distance = None, None
+        for dx in cells:
+            for dy in cells:
+                key = int(self.get_keys(cell_x + dx, cell_y + dy))
+                start = numpy.searchsorted(self.keys, key, side='left')
+                stop = numpy.searchsorted(self.keys, key, side='right')
+                for position in range(start, stop):
+                    offset_x, offset_y = abs(self.xs[position] - x), abs(self.ys[position] - y)
+                    if offset_x >= tolerance or offset_y >= tolerance:
+                        continue
+                    distance = offset_x ** 2 + offset_y ** 2
+                    if best is None or distance < best_distance:
+                        best, best_distance = int(self.indices[position]), distance
+        return best
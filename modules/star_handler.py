@@ -3,6 +3,7 @@ import math
 import re
 import glob
 import os
+import numpy
 from . import coordinates_handler as coordinates
 
 
@@ -18,7 +19,31 @@ DEL_REGEX = re.compile(r'(\+|-)\s?\d{1,2}:\s?\d{1,2}:\s?\d{1,2}')
 MAGNITUDE_REGEX = re.compile(r'\d{1,2}\.\d{1,2}')
 CLASSIFICATION_REGEX = re.compile(r'\s([\w.+-:?!]+?.+?)\s')
 HD_NUMBER_REGEX = re.compile(r'\s(\d+?)\s')
+PROPER_MOTION_REGEX = re.compile(r'([+-]?\d\.\d{3})\s+([+-]?\d\.\d{3})')
+
+# Каталог имеет формат с фиксированной шириной колонок: (начало, конец) поля в строке
+STAR_COLUMNS = {
+    'right_ascension': (4, 14),     # " 5:54:22.9"
+    'declination': (15, 24),        # "+20:16:34"
+    'apparent_magnitude': (41, 47), # "  4.41"
+    'stellar_class': (47, 66),      # "  G0V              "
+    'pm_ra': (66, 74),              # "  -0.189"
+    'pm_dec': (74, 81),             # " -0.084"
+    'hd_number': (92, 99),          # "  39587"
+}
+
 STAR_RADIUS_MAP = {6: 2.5, 5: 3, 4: 3.5, 3: 4, 2: 4.5, 1: 5, 0: 5.5}
+STAR_RADIUS_TABLE = numpy.array([STAR_RADIUS_MAP[i] for i in range(len(STAR_RADIUS_MAP))])
+STAR_COLOR_MAP = {'O': '#C2FEFC', 'B': '#EAF0F0', 'A': '#F9FCC8', 'F': '#F4FE50',
+                  'G': '#FEDB50', 'K': '#FDC289', 'M': '#FD9C89'}
+DEFAULT_STAR_COLOR = '#F4FE50'
+ARCSECONDS_TO_RADIANS = math.pi / (180 * 3600)
+DAYS_PER_JULIAN_YEAR = 365.25
+J2000_DATE = numpy.datetime64('2000-01-01T12:00:00', 's')
+J2000_JULIAN_DATE = 2451545.0
+# количество пар (наблюдатель, звезда), обрабатываемых за один шаг пакетных вычислений
+BATCH_BLOCK_SIZE = 1 << 20
+SECONDS_PER_DAY = 86400
 
 
 class Star:
@@ -27,6 +52,9 @@ class Star:
     Для каждой звезды хранятся её прямое восхождение (Alf), склонение (Del),
     высчитанные горизонтальные координаты и некоторая информацию о звезде
     """
+    __slots__ = ('right_ascension', 'declination', 'altitude', 'azimuth', 'basic_vector',
+                 'projected_coordinates', 'rotated_vector', 'apparent_magnitude', 'info')
+
     def __init__(self, info, observer):
         self.right_ascension = None
         self.declination = None
@@ -37,7 +65,8 @@ class Star:
         self.rotated_vector = None
         self.apparent_magnitude = None
         self.info = ''
-        self.parse(info, observer)
+        if info is not None:
+            self.parse(info, observer)
 
     def parse(self, info, observer):
         """
@@ -46,37 +75,32 @@ class Star:
         :param info: Строка, описывающая звезду
         :param observer: Наблюдатель - экземпляр класса coordinates_handler.Observer
         """
-        right_ascension = ALF_REGEX.search(info)
-        declination = DEL_REGEX.search(info)
-        apparent_magnitude = MAGNITUDE_REGEX.search(info[40:])
-        stellar_class = CLASSIFICATION_REGEX.search(info[46:])
-        hd_number = HD_NUMBER_REGEX.search(info[90:])
-
-        if right_ascension and declination and apparent_magnitude:
-            right_ascension = right_ascension.group(0)
-            declination = declination.group(0)
+        right_ascension, declination, apparent_magnitude, stellar_class, hd_number, _ = parse_star_fields(info)
+        self.fill(right_ascension, declination, apparent_magnitude, stellar_class, hd_number, observer)
 
-            self.apparent_magnitude = float(apparent_magnitude.group(0))
-
-            self.right_ascension = coordinates.AngleMeasuresHMS()
-            self.right_ascension.parse_coordinates(right_ascension, decimal=False)
+    def fill(self, right_ascension, declination, apparent_magnitude, stellar_class, hd_number, observer):
+        """
+        Заполнение полей звезды уже извлечёнными значениями (например, из скомпилированного каталога)
+        :param right_ascension: Прямое восхождение в градусах (десятичный формат)
+        :param declination: Склонение в градусах (десятичный формат)
+        :param apparent_magnitude: Видимая звёздная величина
+        :param stellar_class: Спектральный класс звезды (строка) или None
+        :param hd_number: Номер звезды в каталоге Генри Дрейпера или None
+        :param observer: Наблюдатель - экземпляр класса coordinates_handler.Observer
+        """
+        self.apparent_magnitude = apparent_magnitude
 
-            self.declination = coordinates.AngleMeasuresDMS()
-            self.declination.parse_coordinates(declination, decimal=False)
+        self.right_ascension = coordinates.AngleMeasuresHMS()
+        self.right_ascension.parse_coordinates(right_ascension, decimal=True)
 
-            self.ra_dec_to_alt_az(observer)
+        self.declination = coordinates.AngleMeasuresDMS()
+        self.declination.parse_coordinates(declination, decimal=True)
 
-            if stellar_class:
-                stellar_class = stellar_class.group(1)
-                self.info += 'Stellar Classification: {}\r\n'.format(stellar_class)
+        self.ra_dec_to_alt_az(observer)
 
-            if hd_number:
-                hd_number = hd_number.group(1)
-                self.info += 'Henry Draper Catalog number of the star: {}'.format(hd_number)
+        self.info = format_star_info(stellar_class, hd_number)
 
-            self.basic_vector = coordinates.spherical_to_cartesian(self.altitude, self.azimuth, radius=10)
-        else:
-            raise ValueError
+        self.basic_vector = coordinates.spherical_to_cartesian(self.altitude, self.azimuth, radius=10)
 
     def ra_dec_to_alt_az(self, observer):
         """
@@ -130,23 +154,7 @@ class Star:
         Получение цвета в шестнадцатиричном формате, в зависимости от спектрального класса звезды
         :return: Строка, выражающая цвет в шестнадцатиричном формате
         """
-        info = self.info
-        if info.startswith('O', 24):
-            return '#C2FEFC'
-        elif info.startswith('B', 24):
-            return '#EAF0F0'
-        elif info.startswith('A', 24):
-            return '#F9FCC8'
-        elif info.startswith('F', 24):
-            return '#F4FE50'
-        elif info.startswith('G', 24):
-            return '#FEDB50'
-        elif info.startswith('K', 24):
-            return '#FDC289'
-        elif info.startswith('M', 24):
-            return '#FD9C89'
-        else:
-            return '#F4FE50'
+        return STAR_COLOR_MAP.get(self.info[24:25], DEFAULT_STAR_COLOR)
 
     def get_star_radius(self):
         """
@@ -157,6 +165,394 @@ class Star:
         return STAR_RADIUS_MAP[info]
 
 
+def parse_star_fields(info):
+    """
+    Извлечение полей звезды из строки каталога без привязки к наблюдателю.
+    Строка разбирается по колонкам фиксированной ширины (STAR_COLUMNS), если формат строки
+    не соответствует ожидаемому - используется разбор регулярными выражениями.
+    Выбрасывает исключение ValueError в случае неудачи извлечения важных данных (координаты, звёздная велечина)
+    :param info: Строка, описывающая звезду
+    :return: Кортеж (прямое восхождение в градусах, склонение в градусах, видимая звёздная величина,
+    спектральный класс или None, номер HD или None, собственное движение (по RA, по Dec) в секундах дуги в год)
+    """
+    try:
+        return parse_star_columns(info)
+    except ValueError:
+        return parse_star_regex(info)
+
+
+def get_column(info, name):
+    """
+    Выделение колонки фиксированной ширины из строки каталога
+    :param info: Строка, описывающая звезду
+    :param name: Имя колонки (см. STAR_COLUMNS)
+    :return: Подстрока колонки
+    """
+    start, end = STAR_COLUMNS[name]
+    return info[start:end]
+
+
+def parse_star_columns(info):
+    """
+    Разбор строки каталога по колонкам фиксированной ширины
+    Выбрасывает исключение ValueError, если строка не соответствует формату
+    :param info: Строка, описывающая звезду
+    :return: Кортеж полей звезды (см. parse_star_fields)
+    """
+    if len(info.rstrip('\r\n')) < STAR_COLUMNS['hd_number'][1]:
+        raise ValueError('Line is too short')
+
+    right_ascension = get_column(info, 'right_ascension')
+    declination = get_column(info, 'declination')
+    if (right_ascension[2], right_ascension[5], right_ascension[8]) != (':', ':', '.') \
+            or (declination[3], declination[6]) != (':', ':') or declination[0] not in '+-':
+        raise ValueError('Unexpected coordinates format')
+
+    hours, minutes, seconds = float(right_ascension[0:2]), float(right_ascension[3:5]), float(right_ascension[6:])
+    right_ascension = (hours + minutes / 60 + seconds / 3600) * 15
+
+    sign = -1 if declination[0] == '-' else 1
+    degrees, minutes, seconds = float(declination[1:3]), float(declination[4:6]), float(declination[7:])
+    declination = sign * (degrees + minutes / 60 + seconds / 3600)
+
+    # как и MAGNITUDE_REGEX, знак звёздной величины не учитывается
+    apparent_magnitude = get_column(info, 'apparent_magnitude').strip().lstrip('+-')
+    if '.' not in apparent_magnitude:
+        raise ValueError('Unexpected magnitude format')
+    apparent_magnitude = float(apparent_magnitude)
+
+    stellar_class = get_column(info, 'stellar_class').split()
+    stellar_class = stellar_class[0] if stellar_class else None
+
+    hd_number = get_column(info, 'hd_number').strip()
+    hd_number = int(hd_number) if hd_number.isdigit() else None
+
+    proper_motion = float(get_column(info, 'pm_ra')), float(get_column(info, 'pm_dec'))
+
+    return right_ascension, declination, apparent_magnitude, stellar_class, hd_number, proper_motion
+
+
+def parse_star_regex(info):
+    """
+    Разбор строки каталога регулярными выражениями (используется для строк нестандартного формата)
+    Выбрасывает исключение ValueError в случае неудачи извлечения важных данных (координаты, звёздная велечина)
+    :param info: Строка, описывающая звезду
+    :return: Кортеж полей звезды (см. parse_star_fields)
+    """
+    right_ascension = ALF_REGEX.search(info)
+    declination = DEL_REGEX.search(info)
+    apparent_magnitude = MAGNITUDE_REGEX.search(info[40:])
+    if not (right_ascension and declination and apparent_magnitude):
+        raise ValueError('Star coordinates or magnitude were not found')
+
+    stellar_class = CLASSIFICATION_REGEX.search(info[46:])
+    hd_number = HD_NUMBER_REGEX.search(info[90:])
+    proper_motion = PROPER_MOTION_REGEX.search(info[60:])
+
+    ra_measures = coordinates.AngleMeasuresHMS()
+    ra_measures.parse_coordinates(right_ascension.group(0), decimal=False)
+    dec_measures = coordinates.AngleMeasuresDMS()
+    dec_measures.parse_coordinates(declination.group(0), decimal=False)
+
+    stellar_class = stellar_class.group(1) if stellar_class else None
+    hd_number = int(hd_number.group(1)) if hd_number else None
+    if proper_motion:
+        proper_motion = float(proper_motion.group(1)), float(proper_motion.group(2))
+    else:
+        proper_motion = 0.0, 0.0
+
+    return (ra_measures.decimal, dec_measures.decimal, float(apparent_magnitude.group(0)),
+            stellar_class, hd_number, proper_motion)
+
+
+def format_star_info(stellar_class, hd_number):
+    """
+    Формирование строки с информацией о звезде
+    :param stellar_class: Спектральный класс звезды (строка) или None
+    :param hd_number: Номер звезды в каталоге Генри Дрейпера или None
+    :return: Строка, описывающая звезду
+    """
+    info = ''
+    if stellar_class:
+        info += 'Stellar Classification: {}\r\n'.format(stellar_class)
+    if hd_number:
+        info += 'Henry Draper Catalog number of the star: {}'.format(hd_number)
+    return info
+
+
+def get_star_colors(stellar_classes):
+    """
+    Векторизованный аналог Star.get_star_color
+    :param stellar_classes: Массив спектральных классов (numpy, байтовые строки)
+    :return: Список цветов в шестнадцатиричном формате
+    """
+    first_letters = numpy.char.decode(numpy.asarray(stellar_classes, dtype='S1'), 'cp1251')
+    return [STAR_COLOR_MAP.get(letter, DEFAULT_STAR_COLOR) for letter in first_letters.tolist()]
+
+
+def ra_dec_to_alt_az_arrays(right_ascension, declination, observer):
+    """
+    Векторизованный аналог Star.ra_dec_to_alt_az: переход от экваториальной системы координат
+    к горизонтальной сразу для массива звёзд. Особые случаи (звезда в зените или надире)
+    обрабатываются так же, как в скалярном методе, остальные значения совпадают
+    со скалярным методом с точностью до 1e-9 градуса
+    :param right_ascension: Массив прямых восхождений в градусах
+    :param declination: Массив склонений в градусах
+    :param observer: Наблюдатель - экземпляр класса coordinates_handler.Observer
+    :return: Кортеж массивов (высота, азимут) в градусах
+    """
+    right_ascension = numpy.asarray(right_ascension, dtype=float)
+    declination = numpy.asarray(declination, dtype=float)
+    hour_angle = (observer.local_sidereal_time + observer.long.decimal - right_ascension + 360) % 360
+
+    declination_rad = numpy.radians(declination)
+    hour_angle = numpy.radians(hour_angle)
+    latitude = coordinates.degrees_to_radians(observer.lat.decimal)
+
+    cos_alt = numpy.clip(math.sin(latitude) * numpy.sin(declination_rad) +
+                         math.cos(latitude) * numpy.cos(declination_rad) * numpy.cos(hour_angle), -1, 1)
+    altitude = numpy.degrees(numpy.arcsin(cos_alt))
+
+    z_s = numpy.sin(numpy.arccos(cos_alt))
+    singular = numpy.abs(z_s) < 1e-5
+    z_s = numpy.where(singular, 1, z_s)
+
+    a_s = (numpy.cos(declination_rad) * numpy.sin(hour_angle)) / z_s
+    a_c = (math.sin(latitude) * numpy.cos(declination_rad) * numpy.cos(hour_angle) -
+           math.cos(latitude) * numpy.sin(declination_rad)) / z_s
+    azimuth = (numpy.degrees(numpy.arctan2(a_s, a_c)) + 360) % 360
+
+    # избегаем деление на ноль: звезда в зените или надире
+    degenerate = singular | ((a_s == 0) & (a_c == 0))
+    azimuth[degenerate] = numpy.where(declination[degenerate] > 0, 180, 0)
+    same_hemisphere = (((declination > 0) & (observer.lat.decimal > 0)) |
+                       ((declination < 0) & (observer.lat.decimal < 0)))
+    altitude[singular] = numpy.where(same_hemisphere[singular], 90, -90)
+    return altitude, azimuth
+
+
+def get_equatorial_vectors(right_ascension, declination):
+    """
+    Вычисление экваториальных единичных векторов (J2000) звёзд.
+    Векторы не зависят от наблюдателя, поэтому вычисляются один раз для всего каталога
+    :param right_ascension: Массив прямых восхождений в градусах
+    :param declination: Массив склонений в градусах
+    :return: Массив numpy размера (N, 3)
+    """
+    return coordinates.spherical_to_cartesian_arrays(declination, right_ascension)
+
+
+def get_epoch_years(date):
+    """
+    Вычисление количества юлианских лет, прошедших с эпохи J2000
+    :param date: Дата - объект datetime.datetime
+    :return: Количество лет (может быть отрицательным)
+    """
+    return days_passed_from_date(date) / DAYS_PER_JULIAN_YEAR
+
+
+def propagate_proper_motion(right_ascension, declination, pm_ra, pm_dec, years):
+    """
+    Векторизованный перенос положений звёзд (J2000) на заданную эпоху с учётом собственного движения.
+    Звезда смещается вдоль касательных к небесной сфере направлений на восток и на север,
+    после чего вектор снова нормализуется
+    :param right_ascension: Массив прямых восхождений в градусах
+    :param declination: Массив склонений в градусах
+    :param pm_ra: Массив собственных движений по прямому восхождению (μα·cosδ) в секундах дуги в год
+    :param pm_dec: Массив собственных движений по склонению в секундах дуги в год
+    :param years: Количество лет, прошедших с эпохи J2000
+    :return: Массив экваториальных единичных векторов numpy размера (N, 3)
+    """
+    right_ascension = numpy.radians(right_ascension)
+    declination = numpy.radians(declination)
+    sin_ra, cos_ra = numpy.sin(right_ascension), numpy.cos(right_ascension)
+    sin_dec, cos_dec = numpy.sin(declination), numpy.cos(declination)
+    shift_east = numpy.asarray(pm_ra, dtype=float) * (years * ARCSECONDS_TO_RADIANS)
+    shift_north = numpy.asarray(pm_dec, dtype=float) * (years * ARCSECONDS_TO_RADIANS)
+
+    vectors = numpy.empty((len(right_ascension), 3))
+    vectors[:, 0] = cos_dec * cos_ra - shift_east * sin_ra - shift_north * sin_dec * cos_ra
+    vectors[:, 1] = cos_dec * sin_ra + shift_east * cos_ra - shift_north * sin_dec * sin_ra
+    vectors[:, 2] = sin_dec + shift_north * cos_dec
+    vectors /= numpy.linalg.norm(vectors, axis=1)[:, None]
+    return vectors
+
+
+def get_horizontal_vectors(equatorial_vectors, observer):
+    """
+    Переход от экваториальных единичных векторов к горизонтальным (базовым) векторам
+    с помощью матрицы поворота наблюдателя. При смене даты или положения наблюдателя
+    пересчитывается только матрица, а разбор каталога не требуется
+    :param equatorial_vectors: Массив экваториальных векторов размера (N, 3)
+    :param observer: Наблюдатель - экземпляр класса coordinates_handler.Observer
+    :return: Массив горизонтальных единичных векторов размера (N, 3)
+    """
+    return equatorial_vectors @ observer.rotation_matrix.T
+
+
+def get_batch_rotation_matrices(latitudes, longitudes, dates):
+    """
+    Матрицы поворота для массива наблюдателей. Широты, долготы и даты приводятся к общей форме
+    по правилам numpy, поэтому можно передать одно место и много дат или много мест и одну дату
+    :param latitudes: Широты в градусах (десятичный формат)
+    :param longitudes: Долготы в градусах (десятичный формат)
+    :param dates: Даты (datetime.datetime или numpy.datetime64)
+    :return: Массив матриц размера (M, 3, 3)
+    """
+    latitudes, longitudes, dates = numpy.broadcast_arrays(numpy.asarray(latitudes, dtype=float),
+                                                          numpy.asarray(longitudes, dtype=float),
+                                                          numpy.asarray(dates, dtype='datetime64[s]'))
+    sidereal_times = coordinates.get_local_sidereal_times(dates.ravel(), longitudes.ravel())
+    return coordinates.get_rotation_matrices(latitudes.ravel(), longitudes.ravel(), sidereal_times)
+
+
+def get_batch_chunk_size(stars_count, chunk_size=None):
+    """
+    Размер блока наблюдателей: промежуточные массивы блока содержат не более BATCH_BLOCK_SIZE пар
+    звезда-наблюдатель
+    :param stars_count: Количество звёзд
+    :param chunk_size: Количество наблюдателей в блоке, None - по BATCH_BLOCK_SIZE
+    :return: Количество наблюдателей, обрабатываемых за один шаг
+    """
+    if chunk_size is None:
+        chunk_size = BATCH_BLOCK_SIZE // max(stars_count, 1)
+    return max(int(chunk_size), 1)
+
+
+def generate_alt_az_batch(equatorial_vectors, matrices, chunk_size=None):
+    """
+    Пакетный переход к горизонтальной системе координат для многих наблюдателей.
+    Наблюдатели обрабатываются блоками, поэтому объём промежуточных массивов ограничен
+    :param equatorial_vectors: Массив экваториальных векторов размера (N, 3)
+    :param matrices: Матрицы поворота наблюдателей размера (M, 3, 3), см. get_batch_rotation_matrices
+    :param chunk_size: Количество наблюдателей в блоке, None - по BATCH_BLOCK_SIZE
+    :return: Генератор кортежей (номер первого наблюдателя блока, высоты, азимуты),
+    высоты и азимуты - массивы размера (наблюдатели блока, N) в градусах
+    """
+    chunk_size = get_batch_chunk_size(len(equatorial_vectors), chunk_size)
+    transposed = equatorial_vectors.T
+    for start in range(0, len(matrices), chunk_size):
+        horizontal = matrices[start:start + chunk_size] @ transposed
+        altitude = numpy.degrees(numpy.arcsin(numpy.clip(horizontal[:, 2], -1, 1)))
+        azimuth = numpy.degrees(numpy.arctan2(horizontal[:, 1], horizontal[:, 0])) % 360
+        yield start, altitude, azimuth
+
+
+def get_alt_az_batch(equatorial_vectors, latitudes, longitudes, dates, chunk_size=None, dtype=numpy.float32):
+    """
+    Высоты и азимуты всех звёзд для массива наблюдателей (мест и моментов наблюдения)
+    :param equatorial_vectors: Массив экваториальных векторов размера (N, 3)
+    :param latitudes: Широты в градусах (десятичный формат)
+    :param longitudes: Долготы в градусах (десятичный формат)
+    :param dates: Даты (datetime.datetime или numpy.datetime64)
+    :param chunk_size: Количество наблюдателей в блоке, None - по BATCH_BLOCK_SIZE
+    :param dtype: Тип элементов результата
+    :return: Кортеж матриц (высота, азимут) размера (M, N) в градусах
+    """
+    matrices = get_batch_rotation_matrices(latitudes, longitudes, dates)
+    altitude = numpy.empty((len(matrices), len(equatorial_vectors)), dtype=dtype)
+    azimuth = numpy.empty_like(altitude)
+    for start, chunk_altitude, chunk_azimuth in generate_alt_az_batch(equatorial_vectors, matrices, chunk_size):
+        altitude[start:start + len(chunk_altitude)] = chunk_altitude
+        azimuth[start:start + len(chunk_azimuth)] = chunk_azimuth
+    return altitude, azimuth
+
+
+def get_visibility_batch(equatorial_vectors, latitudes, longitudes, dates, min_altitude=0, chunk_size=None):
+    """
+    Маски видимости звёзд для массива наблюдателей. Для проверки достаточно вертикальной
+    компоненты горизонтального вектора (синуса высоты), поэтому азимуты не вычисляются
+    :param equatorial_vectors: Массив экваториальных векторов размера (N, 3)
+    :param latitudes: Широты в градусах (десятичный формат)
+    :param longitudes: Долготы в градусах (десятичный формат)
+    :param dates: Даты (datetime.datetime или numpy.datetime64)
+    :param min_altitude: Минимальная высота над горизонтом в градусах
+    :param chunk_size: Количество наблюдателей в блоке, None - по BATCH_BLOCK_SIZE
+    :return: Булев массив размера (M, N)
+    """
+    zenith_rows = get_batch_rotation_matrices(latitudes, longitudes, dates)[:, 2]
+    threshold = math.sin(math.radians(min_altitude))
+    chunk_size = get_batch_chunk_size(len(equatorial_vectors), chunk_size)
+    visible = numpy.empty((len(zenith_rows), len(equatorial_vectors)), dtype=bool)
+    for start in range(0, len(zenith_rows), chunk_size):
+        numpy.greater(zenith_rows[start:start + chunk_size] @ equatorial_vectors.T, threshold,
+                      out=visible[start:start + chunk_size])
+    return visible
+
+
+def get_event_dates(start, seconds, duration):
+    """
+    Перевод смещений событий от начала интервала в даты
+    :param start: Начало интервала - объект datetime.datetime
+    :param seconds: Массив смещений в секундах (NaN - события нет)
+    :param duration: Длительность интервала в секундах, более поздние события отбрасываются
+    :return: Массив дат numpy.datetime64 с точностью до миллисекунды, NaT - события нет в интервале
+    """
+    dates = numpy.full(len(seconds), numpy.datetime64('NaT'), dtype='datetime64[ms]')
+    inside = seconds <= duration
+    dates[inside] = numpy.datetime64(start, 'ms') + numpy.round(seconds[inside] * 1000).astype('timedelta64[ms]')
+    return dates
+
+
+def get_rise_transit_set(equatorial_vectors, observer, duration=SECONDS_PER_DAY, min_altitude=0):
+    """
+    Вычисление моментов восхода, верхней кульминации и захода всех звёзд и их максимальной высоты
+    в интервале наблюдения, начинающемся с даты наблюдателя.
+    Звёздное время (см. Observer.calc_local_sidereal_time) растёт линейно со скоростью
+    coordinates_handler.SIDEREAL_RATE, поэтому часовой угол каждой звезды - линейная функция времени,
+    и моменты событий находятся в замкнутой форме, без перебора по времени:
+    кульминация - часовой угол равен 0, восход и заход - часовой угол равен -H0 и H0, где
+    cos(H0) = (sin(h0) - sin(широта)sin(склонение)) / (cos(широта)cos(склонение))
+    :param equatorial_vectors: Массив экваториальных векторов размера (N, 3)
+    :param observer: Наблюдатель - экземпляр класса coordinates_handler.Observer
+    :param duration: Длительность интервала наблюдения в секундах
+    :param min_altitude: Высота h0 (в градусах), на которой звезда считается восшедшей
+    :return: Словарь массивов: 'rise', 'transit', 'set' - даты событий (numpy.datetime64, NaT - события
+    нет в интервале), 'max_altitude' - максимальная высота в интервале в градусах,
+    'circumpolar' - звезда не заходит, 'never_rises' - звезда не восходит
+    """
+    equatorial_vectors = numpy.asarray(equatorial_vectors, dtype=float)
+    declination = numpy.arcsin(numpy.clip(equatorial_vectors[:, 2], -1, 1))
+    right_ascension = numpy.degrees(numpy.arctan2(equatorial_vectors[:, 1], equatorial_vectors[:, 0]))
+    latitude = coordinates.degrees_to_radians(observer.lat.decimal)
+    # угол поворота неба в начале интервала, как в Observer.calc_rotation_matrix
+    theta = observer.local_sidereal_time + observer.long.decimal
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        cos_half_arc = ((math.sin(math.radians(min_altitude)) - math.sin(latitude) * numpy.sin(declination)) /
+                        (math.cos(latitude) * numpy.cos(declination)))
+    circumpolar = cos_half_arc < -1
+    never_rises = cos_half_arc > 1
+    half_arc = numpy.degrees(numpy.arccos(numpy.clip(numpy.nan_to_num(cos_half_arc), -1, 1)))
+
+    def get_seconds(hour_angle):
+        # время до ближайшего момента, когда часовой угол звезды станет равен hour_angle
+        return ((hour_angle + right_ascension - theta) % 360) / coordinates.SIDEREAL_RATE
+
+    transit = get_seconds(0)
+    crossing = ~(circumpolar | never_rises)
+    rise = numpy.where(crossing, get_seconds(-half_arc), numpy.nan)
+    setting = numpy.where(crossing, get_seconds(half_arc), numpy.nan)
+
+    def get_altitude(hour_angle):
+        return numpy.degrees(numpy.arcsin(numpy.clip(
+            math.sin(latitude) * numpy.sin(declination) +
+            math.cos(latitude) * numpy.cos(declination) * numpy.cos(numpy.radians(hour_angle)), -1, 1)))
+
+    # вне кульминации высота монотонна по часовому углу, поэтому максимум достигается на границе интервала
+    max_altitude = numpy.where(transit <= duration,
+                               90 - numpy.abs(observer.lat.decimal - numpy.degrees(declination)),
+                               numpy.maximum(get_altitude(theta - right_ascension),
+                                             get_altitude(theta + coordinates.SIDEREAL_RATE * duration -
+                                                          right_ascension)))
+    return {'rise': get_event_dates(observer.date, rise, duration),
+            'transit': get_event_dates(observer.date, transit, duration),
+            'set': get_event_dates(observer.date, setting, duration),
+            'max_altitude': max_altitude,
+            'circumpolar': circumpolar,
+            'never_rises': never_rises}
+
+
 def days_passed_from_date(date1, date2=datetime.datetime(2000, 1, 1, 12, 0, 0, 0)):
     """
     Вычисление количества дней, прошедших с заданной даты,
@@ -186,6 +582,16 @@ def get_julian_date(date):
     return julian_date
 
 
+def get_julian_dates(dates):
+    """
+    Векторизованный аналог get_julian_date. Доли секунды отбрасываются так же, как в скалярной функции
+    :param dates: Последовательность дат (datetime.datetime или numpy.datetime64)
+    :return: Массив юлианских дат
+    """
+    dates = numpy.asarray(dates, dtype='datetime64[s]')
+    return J2000_JULIAN_DATE + (dates - J2000_DATE) / numpy.timedelta64(1, 'D')
+
+
 def extract_star_from_file(filename):
     """
     Функция извлекает строки из файла, представляющие описание небесного тела
@@ -208,17 +614,16 @@ def star_generator(path):
 
 def rotate_vectors(stars, quaternion):
     """
-    Поворот списка векторов с помощью заданного кватерниона
+    Поворот списка векторов с помощью заданного кватерниона.
+    Кватернион переводится в матрицу поворота один раз, векторы всех звёзд поворачиваются одним матричным произведением
     :param stars: Список звезд, его элементы - объекты класса star_handler.Star
     :param quaternion: Кватернион, описывающий вращение - объект класса coordinates_handler.Quaternion
     """
-    for star in stars:
-        new_vector = quaternion.rotate_vector(star.basic_vector)
+    vectors = numpy.array([(star.basic_vector.x, star.basic_vector.y, star.basic_vector.z) for star in stars],
+                          dtype=float).reshape(-1, 3)
+    for star, (x, y, z) in zip(stars, quaternion.rotate_vectors(vectors).tolist()):
         star.projected_coordinates = coordinates.Vector(0, 0, 0)
-        star.rotated_vector = coordinates.Vector(0, 0, 0)
-        star.rotated_vector.x = new_vector.x
-        star.rotated_vector.y = new_vector.y
-        star.rotated_vector.z = new_vector.z
+        star.rotated_vector = coordinates.Vector(x, y, z)
 
 
 def get_screen_points(stars, dist, fov, canvas_params=3):
@@ -269,6 +674,50 @@ def get_projected_stars(stars, observer, dist=5, width=512, height=512, fov=65):
     :param fov: Field of view в процентах
     :return: Список звезд, содержащий спроектированные координаты в поле класса Star
     """
+    quaternion = get_view_quaternion(observer)
+    rotate_vectors(stars, quaternion)
+    projected = get_screen_points(stars, dist, fov)
+    get_raster_coordinates(projected, width, height)
+    return projected
+
+
+def write_ephemeris(path, equatorial_vectors, latitude, longitude, start, step, steps, chunk_size=None,
+                    dtype=numpy.float32):
+    """
+    Построение таблицы высот и азимутов всех звёзд на равномерной сетке времени.
+    Таблица записывается в файл .npy блоками по времени, поэтому в памяти находится только один блок.
+    Размер таблицы (steps, N, 2): [i, j, 0] - высота, [i, j, 1] - азимут звезды j (в градусах)
+    в момент start + i * step. Файл читается numpy.load, в том числе с mmap_mode='r'
+    :param path: Путь до файла .npy
+    :param equatorial_vectors: Массив экваториальных векторов размера (N, 3)
+    :param latitude: Широта наблюдателя в градусах (десятичный формат)
+    :param longitude: Долгота наблюдателя в градусах (десятичный формат)
+    :param start: Дата начала сетки - объект datetime.datetime
+    :param step: Шаг сетки в секундах
+    :param steps: Количество моментов сетки
+    :param chunk_size: Количество моментов в блоке, None - по BATCH_BLOCK_SIZE
+    :param dtype: Тип элементов таблицы
+    :return: Массив дат сетки (numpy.datetime64)
+    """
+    dates = numpy.datetime64(start, 's') + numpy.arange(steps) * numpy.timedelta64(int(step), 's')
+    chunk_size = get_batch_chunk_size(len(equatorial_vectors), chunk_size)
+    header = {'descr': numpy.lib.format.dtype_to_descr(numpy.dtype(dtype)), 'fortran_order': False,
+              'shape': (steps, len(equatorial_vectors), 2)}
+    with open(path, 'wb') as file:
+        numpy.lib.format.write_array_header_1_0(file, header)
+        for first in range(0, steps, chunk_size):
+            matrices = get_batch_rotation_matrices(latitude, longitude, dates[first:first + chunk_size])
+            for _, altitude, azimuth in generate_alt_az_batch(equatorial_vectors, matrices, chunk_size):
+                numpy.stack((altitude, azimuth), axis=-1).astype(dtype).tofile(file)
+    return dates
+
+
+def get_view_quaternion(observer):
+    """
+    Вычисление кватерниона, поворачивающего вектор взгляда наблюдателя в ось Z
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :return: Нормализованный кватернион - объект класса coordinates_handler.Quaternion
+    """
     if not isinstance(observer, coordinates.Observer):
         raise TypeError
     view_vector = coordinates.Vector(0, 0, 0)
@@ -285,7 +734,148 @@ def get_projected_stars(stars, observer, dist=5, width=512, height=512, fov=65):
     basic_vector = coordinates.Vector(0, 0, 1)
     quaternion = coordinates.Quaternion.get_quaternion(view_vector, basic_vector)
     quaternion.normalize()
-    rotate_vectors(stars, quaternion)
-    projected = get_screen_points(stars, dist, fov)
-    get_raster_coordinates(projected, width, height)
-    return projected
+    return quaternion
+
+
+def rotate_vector_array(vectors, quaternion):
+    """
+    Поворот массива векторов с помощью заданного кватерниона (через матрицу поворота)
+    :param vectors: Массив numpy размера (N, 3)
+    :param quaternion: Нормализованный кватернион - объект класса coordinates_handler.Quaternion
+    :return: Массив повёрнутых векторов размера (N, 3)
+    """
+    return quaternion.rotate_vectors(vectors)
+
+
+def get_screen_arrays(vectors, dist, fov, canvas_params=3):
+    """
+    Векторизованный аналог get_screen_points: проекция массива повёрнутых векторов на плоскость.
+    Отсеиваются точки за пределами плоскости, а также точки, находящиеся позади наблюдателя
+    :param vectors: Массив повёрнутых векторов размера (N, 3)
+    :param dist: Расстояние до плоскости (константа)
+    :param fov: Field of view в процентах
+    :param canvas_params: Максимальная ширина и высота проективной плоскости
+    :return: Кортеж (номера видимых векторов, координаты X и Y в диапозоне от 0 до 1)
+    """
+    canvas_width = canvas_height = (canvas_params * fov) / 100
+    z = vectors[:, 2]
+    in_front = numpy.flatnonzero(z > 0)
+    new_x = dist * vectors[in_front, 0] / z[in_front]
+    new_y = dist * vectors[in_front, 1] / z[in_front]
+    visible = (numpy.abs(new_x) <= canvas_width / 2) & (numpy.abs(new_y) <= canvas_height / 2)
+    x = (new_x[visible] + canvas_width / 2) / canvas_width
+    y = (new_y[visible] + canvas_height / 2) / canvas_height
+    return in_front[visible], x, y
+
+
+def get_star_radii(magnitudes):
+    """
+    Векторизованный аналог Star.get_star_radius
+    :param magnitudes: Массив видимых звёздных величин
+    :return: Массив радиусов звёзд (в пикселях)
+    """
+    rounded = numpy.clip(numpy.round(magnitudes), 0, len(STAR_RADIUS_TABLE) - 1).astype(int)
+    return STAR_RADIUS_TABLE[rounded]
+
+
+def get_projected_arrays(vectors, magnitudes, observer, dist=5, width=512, height=512, fov=65, candidates=None):
+    """
+    Векторизованный аналог get_projected_stars: поворот, проекция, отсечение и
+    перевод в экранные координаты выполняются над всеми звёздами сразу
+    :param vectors: Массив базовых (горизонтальных) векторов звёзд размера (N, 3)
+    :param magnitudes: Массив видимых звёздных величин размера N
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param dist: Расстояние до плоскости (константа)
+    :param width: Ширина экрана
+    :param height: Высота экрана
+    :param fov: Field of view в процентах
+    :param candidates: Массив номеров звёзд, которые могут быть видны (см. get_view_candidates).
+    Если не задан - обрабатываются все звёзды
+    :return: Кортеж массивов (номера видимых звёзд, экранные координаты X, Y, радиусы звёзд)
+    """
+    if candidates is None:
+        candidates = numpy.arange(len(vectors))
+    camera_vectors = get_camera_vectors(vectors, observer, candidates)
+    return project_camera_vectors(camera_vectors, candidates, magnitudes, dist=dist, width=width, height=height,
+                                  fov=fov)
+
+
+def get_camera_vectors(vectors, observer, candidates):
+    """
+    Поворот векторов звёзд в систему координат камеры (вектор взгляда наблюдателя переходит в ось Z)
+    :param vectors: Массив базовых (горизонтальных) векторов звёзд размера (N, 3)
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param candidates: Массив номеров поворачиваемых звёзд
+    :return: Массив повёрнутых векторов размера (len(candidates), 3)
+    """
+    return rotate_vector_array(vectors[candidates], get_view_quaternion(observer))
+
+
+def project_camera_vectors(camera_vectors, candidates, magnitudes, dist=5, width=512, height=512, fov=65):
+    """
+    Проекция векторов в системе координат камеры на экран. Поворот не выполняется, поэтому при изменении
+    только fov (масштабирование) повёрнутые векторы можно использовать повторно
+    :param camera_vectors: Массив повёрнутых векторов размера (M, 3) (см. get_camera_vectors)
+    :param candidates: Массив номеров звёзд, соответствующих векторам
+    :param magnitudes: Массив видимых звёздных величин всех звёзд
+    :param dist: Расстояние до плоскости (константа)
+    :param width: Ширина экрана
+    :param height: Высота экрана
+    :param fov: Field of view в процентах
+    :return: Кортеж массивов (номера видимых звёзд, экранные координаты X, Y, радиусы звёзд)
+    """
+    indices, x, y = get_screen_arrays(camera_vectors, dist, fov)
+    indices = candidates[indices]
+    x = (x * width).astype(int)
+    y = ((1 - y) * height).astype(int)
+    return indices, x, y, get_star_radii(magnitudes[indices])
+
+
+def get_view_radius(dist, fov, canvas_params=3, margin=0.5):
+    """
+    Угловой радиус конуса, содержащего проективную плоскость целиком (по её диагонали)
+    :param dist: Расстояние до плоскости (константа)
+    :param fov: Field of view в процентах
+    :param canvas_params: Максимальная ширина и высота проективной плоскости
+    :param margin: Запас в градусах
+    :return: Угловой радиус в градусах
+    """
+    half_size = (canvas_params * fov) / 100 / 2
+    return math.degrees(math.atan(half_size * math.sqrt(2) / dist)) + margin
+
+
+def get_view_candidates(sphere_index, observer, dist=5, fov=65, canvas_params=3):
+    """
+    Отбор звёзд, попадающих в конус взгляда наблюдателя, с помощью индекса экваториальных векторов
+    :param sphere_index: Индекс экваториальных векторов - объект класса spatial_index.SphereIndex
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :param dist: Расстояние до плоскости (константа)
+    :param fov: Field of view в процентах
+    :param canvas_params: Максимальная ширина и высота проективной плоскости
+    :return: Отсортированный массив номеров звёзд
+    """
+    return sphere_index.query(get_view_direction(observer), get_view_radius(dist, fov, canvas_params))
+
+
+def get_view_direction(observer):
+    """
+    Вычисление направления взгляда наблюдателя в экваториальной системе координат
+    :param observer: Наблюдатель - объект класса coordinates_handler.Observer
+    :return: Вектор numpy (не обязательно единичный)
+    """
+    obs_view = observer.view_vector
+    direction = numpy.cos([obs_view.x, obs_view.y, obs_view.z])
+    # матрица поворота ортогональна, обратный переход - транспонированная матрица
+    return observer.rotation_matrix.T @ direction
+
+
+def get_basic_vectors(stars):
+    """
+    Сборка базовых векторов списка звёзд в массив
+    :param stars: Список звёзд, его элементы - объекты класса star_handler.Star
+    :return: Массив numpy размера (N, 3)
+    """
+    vectors = numpy.empty((len(stars), 3))
+    for i, star in enumerate(stars):
+        vectors[i] = star.basic_vector.x, star.basic_vector.y, star.basic_vector.z
+    return vectors
@@ -1,7 +1,7 @@
 import os
+import sys
 import argparse
-from modules import sky_gui
-from tkinter import *
+import datetime
 
 
 def check_version():
@@ -31,6 +31,59 @@ def create_parser():
     parser.add_argument('-m', '--music', type=str, default='Thunderbird.mp3',
                         help='Choose music file which will be played. Default file is "Thunderbird.mp3".'
                              'You can disable it in app by pressing RMB')
+    parser.add_argument('--fps', type=int, default=30,
+                        help='Target frame rate of redrawing while dragging the sky. Default value is 30')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes used to parse the star files when the catalog is (re)compiled. '
+                             '0 means one process per CPU. Default value is 1')
+    parser.add_argument('--budget', type=int, default=20,
+                        help='Time budget of a frame in milliseconds while dragging the sky. Only the brightest stars '
+                             'that fit into it are drawn, fainter ones are filled in after the drag. '
+                             'Default value is 20')
+    parser.add_argument('--speed', type=float, default=960,
+                        help='Time-lapse speed: seconds of observation per second of animation. The animation is '
+                             'started and stopped with the space key. Default value is 960 (a night in 30 seconds)')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Load only the constellation files that intersect the view at start and load the rest '
+                             'in the background while the view moves. A small index of the sky regions of the files '
+                             'is kept in the stars directory')
+    parser.add_argument('--watch', type=float, default=0,
+                        help='Check the star files every WATCH seconds and reload only the changed ones. '
+                             'Not used with --lazy. Default value is 0 (disabled)')
+    parser.add_argument('--backend', type=str, default='items', choices=['items', 'image'],
+                        help='How the stars are drawn: "items" creates a canvas item per star, "image" rasterizes '
+                             'each frame into a single image. Default value is "items"')
+
+    subparsers = parser.add_subparsers(dest='command')
+    render_parser = subparsers.add_parser('render', help='Render a sky chart into a PNG or PPM image without GUI. '
+                                                         'Options --height, --width, --fov and --bright are taken '
+                                                         'from the main arguments')
+    render_parser.add_argument('path', type=str, help='Directory with stars (txt files)')
+    render_parser.add_argument('output', type=str, help='Image file, its extension (.png or .ppm) selects the format')
+    render_parser.add_argument('--date', type=str, default=None,
+                               help='UTC date of observation in "YYYY-MM-DD HH:MM" format. Default is current date')
+    render_parser.add_argument('--lat', type=float, required=True, help='Latitude of the observer in degrees')
+    render_parser.add_argument('--long', type=float, required=True, help='Longitude of the observer in degrees')
+    render_parser.add_argument('--view', type=str, default='0,0,1',
+                               help='View vector "x,y,z". Default value is "0,0,1" (zenith)')
+
+    stats_parser = subparsers.add_parser('stats', help='Print the number of stars in the catalog and the memory '
+                                                       'they take. Option --bright is taken from the main arguments')
+    stats_parser.add_argument('path', type=str, help='Directory with stars (txt files)')
+
+    ephemeris_parser = subparsers.add_parser('ephemeris', help='Write altitude and azimuth of all stars over a time '
+                                                               'grid into a .npy file of shape (steps, stars, 2). '
+                                                               'Option --bright is taken from the main arguments')
+    ephemeris_parser.add_argument('path', type=str, help='Directory with stars (txt files)')
+    ephemeris_parser.add_argument('output', type=str, help='Output .npy file')
+    ephemeris_parser.add_argument('--start', type=str, default=None,
+                                  help='UTC start of the grid in "YYYY-MM-DD HH:MM" format. Default is current date')
+    ephemeris_parser.add_argument('--hours', type=float, default=12,
+                                  help='Length of the grid in hours. Default value is 12')
+    ephemeris_parser.add_argument('--step', type=int, default=60,
+                                  help='Step of the grid in seconds. Default value is 60')
+    ephemeris_parser.add_argument('--lat', type=float, required=True, help='Latitude of the observer in degrees')
+    ephemeris_parser.add_argument('--long', type=float, required=True, help='Longitude of the observer in degrees')
     return parser
 
 
@@ -39,6 +92,90 @@ def check_fov(fov):
         raise_error()
 
 
+def check_fps(fps):
+    if not (1 <= fps <= 240):
+        raise_error()
+
+
+def check_budget(budget):
+    if budget < 0:
+        raise_error()
+
+
+def check_speed(speed):
+    if speed == 0:
+        raise_error()
+
+
+def parse_date(date):
+    if date is None:
+        return None
+    try:
+        return datetime.datetime.strptime(date, '%Y-%m-%d %H:%M')
+    except ValueError:
+        raise_error()
+
+
+def parse_view(view):
+    try:
+        vector = tuple(float(i) for i in view.split(','))
+    except ValueError:
+        raise_error()
+    if len(vector) != 3 or all(abs(i) < 1e-3 for i in vector):
+        raise_error()
+    return vector
+
+
+def render(args):
+    from modules import render_handler
+
+    observer = render_handler.create_observer(parse_date(args.date), args.lat, args.long, parse_view(args.view))
+    errors = render_handler.render_chart(args.path, observer, args.output, fov=args.fov,
+                                         width=args.width, height=args.height, bright=args.bright,
+                                         workers=args.workers or None)
+    for error in errors:
+        print(error, file=sys.stderr)
+
+
+def stats(args):
+    from modules import catalog_handler
+
+    catalog, errors = catalog_handler.load_catalog(args.path, workers=args.workers or None)
+    catalog = catalog_handler.filter_by_brightness(catalog, args.bright)
+    for error in errors:
+        print(error, file=sys.stderr)
+    print('Stars: {}'.format(len(catalog)))
+    print('Bytes per star: {}'.format(catalog.get_bytes_per_star()))
+    print('Catalog memory: {:.1f} KiB'.format(catalog.get_memory_usage() / 1024))
+
+
+def ephemeris(args):
+    from modules import catalog_handler
+    from modules import star_handler
+
+    if args.step <= 0 or args.hours <= 0:
+        raise_error()
+    start = parse_date(args.start) or datetime.datetime.utcnow().replace(second=0, microsecond=0)
+    catalog, errors = catalog_handler.load_catalog(args.path, workers=args.workers or None)
+    catalog = catalog_handler.filter_by_brightness(catalog, args.bright)
+    for error in errors:
+        print(error, file=sys.stderr)
+    steps = int(args.hours * 3600 // args.step) + 1
+    star_handler.write_ephemeris(args.output, catalog.get_equatorial_vectors(start), args.lat, args.long,
+                                 start, args.step, steps)
+    print('Stars: {}, time steps: {} from {} every {} s'.format(len(catalog), steps, start, args.step))
+
+
+def check_watch(watch):
+    if watch < 0:
+        raise_error()
+
+
+def check_workers(workers):
+    if workers < 0:
+        raise_error()
+
+
 def check_bright(bright):
     if bright:
         info = bright.split()
@@ -64,12 +201,32 @@ def main():
     fov = args.fov
     bright = args.bright
     music_path = args.music
+    fps = args.fps
 
     check_fov(fov)
     check_bright(bright)
+    check_fps(fps)
+    check_budget(args.budget)
+    check_speed(args.speed)
+    check_workers(args.workers)
+    check_watch(args.watch)
+
+    if args.command == 'render':
+        render(args)
+        return
+    if args.command == 'stats':
+        stats(args)
+        return
+    if args.command == 'ephemeris':
+        ephemeris(args)
+        return
+
+    from modules import sky_gui
 
     master = sky_gui.ConfigurationWindow(canvas_width=base_width, canvas_height=base_height, fov=fov, bright=bright,
-                                         music_path=music_path)
+                                         music_path=music_path, fps=fps, workers=args.workers or None,
+                                         frame_budget=args.budget, time_speed=args.speed, lazy=args.lazy,
+                                         watch=args.watch, backend=args.backend)
 
     master.mainloop()
 
@@ -2,11 +2,17 @@ import unittest
 import datetime
 import sys
 import os
+import math
+import tempfile
+import numpy
 
 sys.path.append(os.path.join(sys.path[0], 'modules'))
 
 import star_handler
 import coordinates_handler
+import catalog_handler
+import spatial_index
+import render_handler
 
 
 class TestVectors(unittest.TestCase):
@@ -29,6 +35,11 @@ class TestVectors(unittest.TestCase):
         vector1.normalize()
         self.assertAlmostEqual(vector1.get_length(), 1, 1e-4)
 
+    def test_slots(self):
+        vector = coordinates_handler.Vector(1, 2, 3)
+        with self.assertRaises(AttributeError):
+            vector.w = 4
+
     def test_equals(self):
         vector1 = coordinates_handler.Vector(1, 2, 3)
 
@@ -69,6 +80,24 @@ class TestQuaternions(unittest.TestCase):
         rotated_vector.normalize()
         self.assertEqual(rotated_vector, rotate_to)
 
+    def test_rotation_matrix(self):
+        quaternion = coordinates_handler.Quaternion(coordinates_handler.Vector(0.3, -0.5, 0.2), 0.7)
+        quaternion.normalize()
+        vectors = [coordinates_handler.Vector(1, 0, 0), coordinates_handler.Vector(0.2, -3, 1.5)]
+
+        rotated = quaternion.rotate_vectors([(v.x, v.y, v.z) for v in vectors])
+        for vector, (x, y, z) in zip(vectors, rotated):
+            expected = quaternion.rotate_vector(vector)
+            for value, expected_value in [(x, expected.x), (y, expected.y), (z, expected.z)]:
+                self.assertAlmostEqual(value, expected_value, delta=1e-12)
+
+    def test_reversed_keeps_conjunct(self):
+        quaternion = coordinates_handler.Quaternion(coordinates_handler.Vector(1, 1, 1), 5)
+        conjunct = quaternion.get_conjunct()
+        quaternion.reversed()
+        quaternion.reversed()
+        self.assertEqual(conjunct, coordinates_handler.Quaternion(coordinates_handler.Vector(-1, -1, -1), 5))
+
     def test_equals(self):
         quaternion1 = coordinates_handler.Quaternion(coordinates_handler.Vector(1, 1, 1), 5)
 
@@ -227,9 +256,29 @@ class TestAdditionalToolsInCoordinates(unittest.TestCase):
         self.assertAlmostEqual(26.0875, observer.lat.decimal, delta=1e-4)
         self.assertAlmostEqual(-10.21167, observer.long.decimal, delta=1e-4)
 
+    def test_observer_advance_time(self):
+        observer = coordinates_handler.Observer()
+        observer.set_date(datetime.datetime(1998, 8, 10, 23, 10, 0))
+        observer.set_decimal_coordinates('25', '-1.9166667')
+        vectors = star_handler.get_equatorial_vectors(numpy.array([10.0, 200.0, 310.0]),
+                                                      numpy.array([20.0, -30.0, 85.0]))
+        horizontal = star_handler.get_horizontal_vectors(vectors, observer)
+
+        for _ in range(100):
+            horizontal = horizontal @ observer.advance_time(37.5).T
+        self.assertEqual(observer.date, datetime.datetime(1998, 8, 11, 0, 12, 30))
+
+        expected = coordinates_handler.Observer()
+        expected.set_date(observer.date)
+        expected.set_decimal_coordinates('25', '-1.9166667')
+        self.assertAlmostEqual(observer.local_sidereal_time, expected.local_sidereal_time, delta=1e-8)
+        self.assertTrue(numpy.allclose(horizontal, star_handler.get_horizontal_vectors(vectors, expected), atol=1e-10))
+
 
 star1 = ' 35 23:39: 8.3 +50:28:18 111.34 -10.77    2.30   O9V                -0.017 -0.002       +009 222304  18    '
 star2 = ' 37  2:13:36.3 +51: 3:57 135.85 -09.73 W  5.8    M8III:             +0.346 -0.171   111 +027  13530        '
+wide_star = ('119 19:54:48.3 +36:59:46  72.50   4.61    5.76   G1Ib-IICH1Fe-1Ca-1 +0.014 +0.021       '
+             '-024 188650        ')
 bad_star = '5 G8III:    B9V 51: 3:57 135.85 -09.73 W  5 37  2:13:             -10.77    5.300        '
 
 
@@ -260,6 +309,18 @@ class TestToolsInStarHandler(unittest.TestCase):
         with self.assertRaises(ValueError):
             stars = [star_handler.Star(info, self.observer) for info in [star1, star2, bad_star]]
 
+    def test_column_parser(self):
+        for info in [star1, star2]:
+            self.assertEqual(star_handler.parse_star_columns(info), star_handler.parse_star_regex(info))
+        self.assertEqual(star_handler.parse_star_columns(star2)[4], 13530)
+
+        # спектральный класс выходит за границы колонки - строка разбирается регулярными выражениями
+        with self.assertRaises(ValueError):
+            star_handler.parse_star_columns(wide_star)
+        fields = star_handler.parse_star_fields(wide_star)
+        self.assertEqual(fields, star_handler.parse_star_regex(wide_star))
+        self.assertEqual(fields[3], 'G1Ib-IICH1Fe-1Ca-1')
+
     def test_star_color(self):
         star1_, star2_ = [star_handler.Star(info, self.observer) for info in [star1, star2]]
         color1 = '#C2FEFC'
@@ -287,6 +348,470 @@ class TestToolsInStarHandler(unittest.TestCase):
 
         self.assertTrue(all(isinstance(x.rotated_vector, coordinates_handler.Vector) for x in stars))
 
+    def test_rotate_vector_array(self):
+        stars = [star_handler.Star(info, self.observer) for info in [star1, star2]]
+        quaternion = star_handler.get_view_quaternion(self.observer)
+        rotated = star_handler.rotate_vector_array(star_handler.get_basic_vectors(stars), quaternion)
+
+        for star, vector in zip(stars, rotated):
+            expected = quaternion.rotate_vector(star.basic_vector)
+            self.assertTrue(numpy.allclose(vector, [expected.x, expected.y, expected.z], atol=1e-9))
+
+    def test_alt_az_arrays(self):
+        stars = [star_handler.Star(info, self.observer) for info in [star1, star2]]
+        zenith = star_handler.Star(None, self.observer)
+        zenith.fill((self.observer.local_sidereal_time + self.observer.long.decimal) % 360,
+                    self.observer.lat.decimal, 3.0, 'B0', 1, self.observer)
+        stars.append(zenith)
+
+        altitude, azimuth = star_handler.ra_dec_to_alt_az_arrays([star.right_ascension.decimal for star in stars],
+                                                                 [star.declination.decimal for star in stars],
+                                                                 self.observer)
+        for star, alt, az in zip(stars, altitude, azimuth):
+            self.assertAlmostEqual(star.altitude, alt, delta=1e-9)
+            self.assertAlmostEqual(star.azimuth, az, delta=1e-9)
+        self.assertEqual((altitude[2], azimuth[2]), (90, 180))
+
+    def test_horizontal_vectors(self):
+        stars = [star_handler.Star(info, self.observer) for info in [star1, star2]]
+        equatorial = star_handler.get_equatorial_vectors([star.right_ascension.decimal for star in stars],
+                                                         [star.declination.decimal for star in stars])
+
+        self.observer.set_date(datetime.datetime(2017, 5, 1, 17, 25, 0))
+        stars = [star_handler.Star(info, self.observer) for info in [star1, star2]]
+        horizontal = star_handler.get_horizontal_vectors(equatorial, self.observer)
+
+        for star, vector in zip(stars, horizontal):
+            expected = star.basic_vector * (1 / 10)
+            self.assertTrue(numpy.allclose(vector, [expected.x, expected.y, expected.z], atol=1e-9))
+
+    def test_projected_arrays(self):
+        stars = [star_handler.Star(info, self.observer) for info in [star1, star2]]
+        view = coordinates_handler.Vector(stars[0].basic_vector.x, stars[0].basic_vector.y, stars[0].basic_vector.z)
+        view.normalize()
+        self.observer.set_view_vector(coordinates_handler.Vector(*map(math.acos, [view.x, view.y, view.z])))
+
+        vectors = star_handler.get_basic_vectors(stars)
+        magnitudes = numpy.array([star.apparent_magnitude for star in stars])
+        indices, xs, ys, radii = star_handler.get_projected_arrays(vectors, magnitudes, self.observer,
+                                                                   width=900, height=600)
+        projected = star_handler.get_projected_stars(stars, self.observer, width=900, height=600)
+
+        self.assertEqual(indices.tolist(), [0])
+        self.assertEqual(projected[0], stars[0])
+        self.assertEqual((xs[0], ys[0]), (stars[0].projected_coordinates.x, stars[0].projected_coordinates.y))
+        self.assertAlmostEqual(xs[0], 450, delta=1)
+        self.assertAlmostEqual(ys[0], 300, delta=1)
+        self.assertEqual(radii[0], stars[0].get_star_radius())
+
+    def test_batch_visibility(self):
+        right_ascension, declination = numpy.array([10.0, 200.0, 310.0, 95.0]), numpy.array([20.0, -30.0, 85.0, -60.0])
+        vectors = star_handler.get_equatorial_vectors(right_ascension, declination)
+        sites = [(25, -1.9166667), (-33.9, 18.4), (64.1, -21.9)]
+        dates = [datetime.datetime(1998, 8, 10, 23, 10, 0), datetime.datetime(2031, 2, 3, 4, 5, 6, 700000)]
+        latitudes = numpy.array([[lat] for lat, _ in sites])
+        longitudes = numpy.array([[long] for _, long in sites])
+
+        altitude, azimuth = star_handler.get_alt_az_batch(vectors, latitudes, longitudes, dates, chunk_size=2)
+        visible = star_handler.get_visibility_batch(vectors, latitudes, longitudes, dates, min_altitude=10)
+        self.assertEqual(altitude.shape, (6, 4))
+        for row, ((lat, long), date) in enumerate((site, date) for site in sites for date in dates):
+            self.assertAlmostEqual(star_handler.get_julian_dates([date])[0], star_handler.get_julian_date(date))
+            observer = coordinates_handler.Observer()
+            observer.set_date(date)
+            observer.set_decimal_coordinates(str(lat), str(long))
+            expected_altitude, expected_azimuth = star_handler.ra_dec_to_alt_az_arrays(right_ascension,
+                                                                                       declination, observer)
+            self.assertTrue(numpy.allclose(altitude[row], expected_altitude, atol=1e-4))
+            self.assertTrue(numpy.allclose(azimuth[row], expected_azimuth, atol=1e-4))
+            self.assertTrue((visible[row] == (expected_altitude > 10)).all())
+
+    def test_rise_transit_set(self):
+        right_ascension, declination = numpy.array([10.0, 200.0, 310.0, 95.0]), numpy.array([20.0, -30.0, 85.0, -70.0])
+        vectors = star_handler.get_equatorial_vectors(right_ascension, declination)
+        plan = star_handler.get_rise_transit_set(vectors, self.observer)
+        self.assertEqual(plan['circumpolar'].tolist(), [False, False, True, False])
+        self.assertEqual(plan['never_rises'].tolist(), [False, False, False, True])
+        self.assertTrue(numpy.isnat(plan['rise'][2:]).all() and numpy.isnat(plan['set'][2:]).all())
+
+        def get_altitude(event, index):
+            observer = coordinates_handler.Observer()
+            observer.set_date(plan[event][index].astype(datetime.datetime))
+            observer.set_decimal_coordinates('25', '-1.9166667')
+            return star_handler.ra_dec_to_alt_az_arrays(right_ascension, declination, observer)[0][index]
+
+        for index in range(4):
+            self.assertAlmostEqual(get_altitude('transit', index), plan['max_altitude'][index], delta=0.01)
+            self.assertAlmostEqual(plan['max_altitude'][index], 90 - abs(25 - declination[index]), delta=1e-6)
+        for index in range(2):
+            self.assertAlmostEqual(get_altitude('rise', index), 0, delta=0.01)
+            self.assertAlmostEqual(get_altitude('set', index), 0, delta=0.01)
+
+        short = star_handler.get_rise_transit_set(vectors, self.observer, duration=60)
+        self.assertTrue(numpy.isnat(short['transit']).all())
+        self.assertTrue((short['max_altitude'] < plan['max_altitude']).all())
+
+    def test_ephemeris(self):
+        vectors = star_handler.get_equatorial_vectors(numpy.array([10.0, 200.0, 310.0]),
+                                                      numpy.array([20.0, -30.0, 85.0]))
+        start = datetime.datetime(1998, 8, 10, 23, 10, 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'night.npy')
+            dates = star_handler.write_ephemeris(path, vectors, 25, -1.9166667, start, 600, 7, chunk_size=3)
+            table = numpy.load(path)
+
+        self.assertEqual((table.shape, table.dtype), ((7, 3, 2), numpy.float32))
+        self.assertEqual(dates[-1].astype(datetime.datetime), datetime.datetime(1998, 8, 11, 0, 10, 0))
+        altitude, azimuth = star_handler.get_alt_az_batch(vectors, 25, -1.9166667, dates)
+        self.assertTrue((table[..., 0] == altitude).all() and (table[..., 1] == azimuth).all())
+
+    def test_camera_vectors_reuse(self):
+        vectors = numpy.random.RandomState(1).normal(size=(500, 3))
+        vectors /= numpy.linalg.norm(vectors, axis=1)[:, None]
+        magnitudes = numpy.linspace(0, 6, 500)
+        candidates = numpy.arange(500)
+        camera_vectors = star_handler.get_camera_vectors(vectors, self.observer, candidates)
+
+        for fov in [100, 65, 20]:
+            expected = star_handler.get_projected_arrays(vectors, magnitudes, self.observer, width=900, height=600,
+                                                         fov=fov)
+            projected = star_handler.project_camera_vectors(camera_vectors, candidates, magnitudes,
+                                                            width=900, height=600, fov=fov)
+            for expected_array, array in zip(expected, projected):
+                self.assertEqual(expected_array.tolist(), array.tolist())
+
+
+class TestCatalogHandler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        with open(os.path.join(self.path, 'and.txt'), 'w', encoding='cp1251') as file:
+            file.write('\n'.join([star1, star2, bad_star]) + '\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_compile_and_load(self):
+        compiled, errors = catalog_handler.compile_catalog(self.path)
+        loaded, cached_errors = catalog_handler.load_catalog(self.path)
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].endswith('and.txt:3: Star coordinates or magnitude were not found'))
+        self.assertEqual(cached_errors, errors)
+
+        self.assertEqual(len(loaded['right_ascension']), 2)
+        for name, _ in catalog_handler.CATALOG_COLUMNS:
+            self.assertTrue((compiled[name] == loaded[name]).all())
+
+        self.assertAlmostEqual(loaded['right_ascension'][0], 354.78458, delta=1e-4)
+        self.assertAlmostEqual(loaded['declination'][1], 51.06583, delta=1e-4)
+        self.assertEqual(loaded['stellar_class'][1], b'M8III:')
+        self.assertEqual(loaded['hd_number'][0], 222304)
+        self.assertAlmostEqual(loaded['pm_ra'][1], 0.346, delta=1e-4)
+
+    def test_rebuild_on_change(self):
+        catalog_handler.load_catalog(self.path)
+        with open(os.path.join(self.path, 'and.txt'), 'a', encoding='cp1251') as file:
+            file.write(star1 + '\n')
+
+        loaded, _ = catalog_handler.load_catalog(self.path)
+        self.assertEqual(len(loaded['right_ascension']), 3)
+
+    def test_fixed_width_lines(self):
+        with open(os.path.join(self.path, 'and.txt'), 'w', encoding='cp1251') as file:
+            file.write('\n'.join([star1, wide_star, bad_star, star2]) + '\n')
+        catalog, errors = catalog_handler.parse_source(os.path.join(self.path, 'and.txt'))
+        self.assertEqual(catalog['hd_number'].tolist(), [222304, 188650, 13530])
+        self.assertEqual(catalog['stellar_class'][[0, 2]].tolist(), [b'O9V', b'M8III:'])
+        self.assertEqual(catalog['apparent_magnitude'][[0, 2]].tolist(), [2.3, 5.8])
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].endswith('and.txt:3: Star coordinates or magnitude were not found'))
+
+    def test_raw_reading(self):
+        filename = os.path.join(self.path, 'and.txt')
+        with open(filename, 'wb') as file:
+            file.write(star1.encode('cp1251') + b'\r\n   \r\n\x98' + star2[1:].encode('cp1251') + b'\r\n\r\n' +
+                       star2.encode('cp1251'))
+        catalog, errors = catalog_handler.parse_source(filename)
+        self.assertEqual(catalog['hd_number'].tolist(), [222304, 13530])
+        self.assertEqual(len(errors), 1)
+        self.assertIn('and.txt:3: ', errors[0])
+
+        with open(filename, 'wb'):
+            pass
+        catalog, errors = catalog_handler.parse_source(filename)
+        self.assertEqual((len(catalog['hd_number']), errors), (0, []))
+
+    def test_star_catalog(self):
+        catalog, _ = catalog_handler.load_catalog(self.path)
+        self.assertIsInstance(catalog, catalog_handler.StarCatalog)
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(catalog.get_bytes_per_star(), 56)
+        self.assertEqual(catalog.get_memory_usage(), 112)
+
+        view = catalog.view(1)
+        self.assertEqual((view.stellar_class, view.hd_number), ('M8III:', 13530))
+        self.assertAlmostEqual(view.apparent_magnitude, 5.8)
+        self.assertEqual(view.info, star_handler.format_star_info('M8III:', 13530))
+        with self.assertRaises(AttributeError):
+            view.name = 'Mirach'
+
+        bright = catalog_handler.filter_by_brightness(catalog, 'less 3')
+        self.assertIsInstance(bright, catalog_handler.StarCatalog)
+        self.assertEqual(bright.view(0).hd_number, 222304)
+
+    def test_proper_motion(self):
+        catalog, _ = catalog_handler.load_catalog(self.path)
+        basic = star_handler.get_equatorial_vectors(catalog['right_ascension'], catalog['declination'])
+        self.assertTrue(numpy.allclose(catalog.get_equatorial_vectors(), basic, atol=1e-12))
+
+        date = datetime.datetime(2100, 1, 1, 12, 0, 0)
+        vectors = catalog.get_equatorial_vectors(date)
+        self.assertIs(catalog.get_equatorial_vectors(date + datetime.timedelta(hours=1)), vectors)
+        self.assertTrue(numpy.allclose(numpy.linalg.norm(vectors, axis=1), 1))
+
+        shift = numpy.degrees(numpy.arccos(numpy.clip(numpy.sum(vectors * basic, axis=1), -1, 1))) * 3600
+        expected = numpy.hypot(catalog['pm_ra'], catalog['pm_dec']) * star_handler.get_epoch_years(date)
+        self.assertTrue(numpy.allclose(shift, expected, atol=0.01))
+
+    def test_lazy_catalog(self):
+        south = (' 99  2:13:36.3 -51: 3:57 135.85 -09.73 W  4.1    B9V                +0.012 -0.003       '
+                 '+012  15000        ')
+        with open(os.path.join(self.path, 'phe.txt'), 'w', encoding='cp1251') as file:
+            file.write(south + '\n')
+        north, south = numpy.array([0.5, 0.1, 0.86]), numpy.array([0.4, 0.5, -0.77])
+
+        lazy = catalog_handler.LazyCatalog(self.path)
+        self.assertTrue(os.path.exists(os.path.join(self.path, catalog_handler.CAPS_FILENAME)))
+        self.assertEqual(len(lazy.get_catalog()), 3)
+
+        lazy = catalog_handler.LazyCatalog(self.path)
+        self.assertEqual(len(lazy.get_catalog()), 0)
+        self.assertEqual(lazy.get_missing_files(north, 30), [os.path.join(self.path, 'and.txt')])
+        self.assertEqual(lazy.get_missing_files(north, 180), [os.path.join(self.path, 'and.txt'),
+                                                              os.path.join(self.path, 'phe.txt')])
+        lazy.load_files(lazy.get_missing_files(north, 30))
+        self.assertEqual(lazy.get_catalog()['hd_number'].tolist(), [222304, 13530])
+        self.assertEqual(len(lazy.errors), 1)
+
+        self.assertTrue(lazy.request(south, 30))
+        for future in list(lazy.pending.values()):
+            future.result()
+        self.assertEqual(lazy.collect(), [os.path.join(self.path, 'phe.txt')])
+        self.assertEqual(lazy.get_catalog()['hd_number'].tolist(), [222304, 13530, 15000])
+        self.assertFalse(lazy.request(south, 30))
+        lazy.close()
+
+    def test_catalog_manager(self):
+        filename = os.path.join(self.path, 'and.txt')
+        manager = catalog_handler.CatalogManager(self.path)
+        catalog, sphere_index = manager.catalog, manager.sphere_index
+        self.assertEqual((len(catalog), len(manager.errors)), (2, 1))
+        self.assertEqual(manager.refresh(), [])
+
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(manager.refresh(), [])
+
+        with open(filename, 'w', encoding='cp1251') as file:
+            file.write('\n'.join([star1, star2.replace('+51: 3:57', '-51: 3:57'), bad_star]) + '\n')
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        self.assertEqual(manager.refresh(), [filename])
+        self.assertIs(manager.catalog, catalog)
+        self.assertIs(manager.sphere_index, sphere_index)
+        self.assertAlmostEqual(catalog['declination'][1], -51.065833, delta=1e-6)
+        self.assertEqual(sphere_index.query(star_handler.get_equatorial_vectors([33.4], [-51.07])[0], 1).tolist(), [1])
+        with manager.snapshot() as (snapshot_catalog, snapshot_index):
+            self.assertIs(snapshot_catalog, catalog)
+            self.assertIs(snapshot_index, sphere_index)
+
+        observer = render_handler.create_observer(datetime.datetime(2100, 1, 1), 25, -1.9166667, (0, 0, 1))
+        view = star_handler.get_horizontal_vectors(catalog.get_equatorial_vectors(observer.date), observer)[0]
+        observer = render_handler.create_observer(observer.date, 25, -1.9166667, view)
+        image = render_handler.render_manager(manager, observer, width=90, height=60)
+        self.assertIsNot(manager.sphere_index, sphere_index)
+        self.assertTrue((manager.sphere_index.vectors == catalog.get_equatorial_vectors(observer.date)).all())
+        self.assertTrue((image == render_handler.render_catalog(catalog, observer, width=90, height=60)).all())
+        self.assertTrue(image.any())
+
+        with open(os.path.join(self.path, 'tau.txt'), 'w', encoding='cp1251') as file:
+            file.write(wide_star + '\n')
+        self.assertEqual(manager.refresh(), [os.path.join(self.path, 'tau.txt')])
+        self.assertEqual(manager.catalog['hd_number'].tolist(), [222304, 13530, 188650])
+        self.assertEqual(len(manager.sphere_index), 3)
+
+        os.remove(filename)
+        self.assertEqual(manager.refresh(), [filename])
+        self.assertEqual(manager.catalog['hd_number'].tolist(), [188650])
+        self.assertEqual(manager.errors, [])
+
+    def test_catalog_manager_ranges(self):
+        filename = os.path.join(self.path, 'tau.txt')
+        with open(filename, 'w', encoding='cp1251') as file:
+            file.write(wide_star + '\n')
+        manager = catalog_handler.CatalogManager(self.path)
+        self.assertEqual(list(manager.ranges.values()), [(0, 2), (2, 3)])
+
+        with open(filename, 'a', encoding='cp1251') as file:
+            file.write(star1 + '\n')
+        self.assertEqual(manager.refresh(), [filename])
+        self.assertEqual(list(manager.ranges.values()), [(0, 2), (2, 4)])
+        self.assertEqual((len(manager.catalog), len(manager.sphere_index)), (4, 4))
+
+        with open(filename, 'w', encoding='cp1251') as file:
+            file.write(star1 + '\n')
+        self.assertEqual(manager.refresh(), [filename])
+        self.assertEqual(list(manager.ranges.values()), [(0, 2), (2, 3)])
+        self.assertEqual(manager.catalog['hd_number'].tolist(), [222304, 13530, 222304])
+
+    def test_brightness_range(self):
+        catalog = catalog_handler.sort_by_brightness(catalog_handler.parse_sources(
+            catalog_handler.get_source_files(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          'stars', 'txt')))[0])
+        magnitudes = catalog['apparent_magnitude']
+        self.assertTrue((numpy.diff(magnitudes) >= 0).all())
+
+        for bright in ['more 0', 'more 4.5', 'less 3', 'less 3.01', 'less 100']:
+            first, last = catalog_handler.get_brightness_range(magnitudes, *catalog_handler.parse_brightness(bright))
+            filtered = catalog_handler.filter_by_brightness(catalog, bright)
+            self.assertEqual(last - first, len(filtered))
+            self.assertTrue((magnitudes[first:last] == filtered['apparent_magnitude']).all())
+
+    def test_magnitude_tiers(self):
+        magnitudes = numpy.array([-0.5, 0.3, 1.0, 1.2, 2.9, 5.1, 5.5])
+        self.assertEqual(catalog_handler.get_magnitude_tiers(magnitudes),
+                         [(0, 1), (1, 2), (2, 4), (4, 5), (5, 7)])
+        self.assertEqual(catalog_handler.get_magnitude_tiers(numpy.array([])), [])
+
+    def test_parallel_parsing(self):
+        with open(os.path.join(self.path, 'ori.txt'), 'w', encoding='cp1251') as file:
+            file.write('\n'.join([star2, star1]) + '\n')
+        filenames = catalog_handler.get_source_files(self.path)
+
+        serial, serial_errors = catalog_handler.parse_sources(filenames)
+        parallel, parallel_errors = catalog_handler.parse_sources(filenames, workers=2)
+
+        self.assertEqual(serial_errors, parallel_errors)
+        self.assertEqual(serial['hd_number'].tolist(), [222304, 13530, 13530, 222304])
+        for name, _ in catalog_handler.CATALOG_COLUMNS:
+            self.assertTrue((serial[name] == parallel[name]).all())
+
+    def test_catalog_star(self):
+        observer = coordinates_handler.Observer()
+        observer.set_date(datetime.datetime(1998, 8, 10, 23, 10, 0))
+        observer.set_decimal_coordinates('25', '-1.9166667')
+        observer.calibrate_sidereal_time()
+
+        catalog, _ = catalog_handler.load_catalog(self.path)
+        star = catalog_handler.catalog_star(catalog, 0, observer)
+        expected = star_handler.Star(star1, observer)
+
+        self.assertEqual(star.info, expected.info)
+        self.assertAlmostEqual(star.altitude, expected.altitude, delta=1e-9)
+        self.assertAlmostEqual(star.azimuth, expected.azimuth, delta=1e-9)
+
+
+class TestSphereIndex(unittest.TestCase):
+    def setUp(self):
+        right_ascension, declination = numpy.meshgrid(numpy.arange(0, 360, 3.7), numpy.arange(-89, 90, 2.9))
+        self.vectors = star_handler.get_equatorial_vectors(right_ascension.ravel(), declination.ravel())
+        self.index = spatial_index.SphereIndex(self.vectors)
+
+    def check_query(self, direction, radius):
+        result = self.index.query(direction, radius)
+        direction = numpy.array(direction) / numpy.linalg.norm(direction)
+        expected = numpy.flatnonzero(self.vectors @ direction >= math.cos(math.radians(radius)))
+        self.assertEqual(result.tolist(), expected.tolist())
+
+    def test_query(self):
+        self.check_query([1, 0, 0], 10)
+        self.check_query([1, -0.01, 0.2], 25)
+        self.check_query([0.3, 0.4, -0.5], 1)
+
+    def test_query_near_pole(self):
+        self.check_query([0.1, 0.1, 1], 15)
+        self.check_query([0, 0, -1], 40)
+        self.check_query([1, 1, 1], 120)
+
+    def test_view_candidates(self):
+        observer = coordinates_handler.Observer()
+        observer.set_date(datetime.datetime(1998, 8, 10, 23, 10, 0))
+        observer.set_decimal_coordinates('25', '-1.9166667')
+        observer.set_view_vector(coordinates_handler.Vector(1, 1.2, 0.9))
+        vectors = star_handler.get_horizontal_vectors(self.vectors, observer)
+        magnitudes = numpy.zeros(len(vectors))
+
+        candidates = star_handler.get_view_candidates(self.index, observer, fov=80)
+        culled = star_handler.get_projected_arrays(vectors, magnitudes, observer, fov=80, candidates=candidates)
+        full = star_handler.get_projected_arrays(vectors, magnitudes, observer, fov=80)
+
+        self.assertLess(len(candidates), len(vectors))
+        self.assertTrue(len(full[0]) > 0)
+        self.assertTrue(all(numpy.array_equal(i, j) for i, j in zip(culled, full)))
+
+
+class TestScreenGrid(unittest.TestCase):
+    def test_query(self):
+        grid = spatial_index.ScreenGrid([10, 11, 12], [100, 103, 400], [50, 50, 300])
+
+        self.assertEqual(grid.query(101, 51), 10)
+        self.assertEqual(grid.query(102, 50), 11)
+        self.assertEqual(grid.query(398, 299), 12)
+        self.assertIsNone(grid.query(250, 150))
+        self.assertIsNone(grid.query(400, 303))
+
+    def test_empty(self):
+        grid = spatial_index.ScreenGrid([], [], [])
+        self.assertIsNone(grid.query(10, 10))
+
+
+class TestRenderHandler(unittest.TestCase):
+    def setUp(self):
+        self.observer = render_handler.create_observer(datetime.datetime(1998, 8, 10, 23, 10, 0), 25, -1.9166667,
+                                                       (1, 1, 1))
+
+    def test_draw_disc(self):
+        image = render_handler.create_image(20, 10)
+        render_handler.draw_disc(image, 5, 5, 2.5, (255, 0, 0))
+
+        self.assertEqual(image[5, 5].tolist(), [255, 0, 0])
+        self.assertEqual(image[5, 8].tolist(), [0, 0, 0])
+        self.assertEqual(int((image[:, :, 0] == 255).sum()), 16)
+
+    def test_rasterize_arrays(self):
+        xs, ys, radii = numpy.array([5, 9.3, -1, 18.7]), numpy.array([5, 6.6, 2, 9.5]), numpy.array([2.5, 5.5, 3, 4])
+        colors = ['#C2FEFC', '#FD9C89', '#C2FEFC', '#F4FE50']
+        self.assertEqual(render_handler.get_rgb_colors(colors)[1].tolist(), [253, 156, 137])
+
+        image1 = render_handler.create_image(20, 10)
+        render_handler.rasterize(image1, xs, ys, radii, colors)
+        image2 = render_handler.create_image(20, 10)
+        render_handler.rasterize_arrays(image2, xs, ys, radii, render_handler.get_rgb_colors(colors))
+        self.assertTrue((image1 == image2).all())
+
+    def test_render_stars_and_catalog(self):
+        stars = [star_handler.Star(info, self.observer) for info in [star1, star2]]
+        view = stars[0].basic_vector
+        self.observer = render_handler.create_observer(self.observer.date, 25, -1.9166667, (view.x, view.y, view.z))
+
+        catalog = catalog_handler.empty_catalog(1)
+        catalog['right_ascension'][0] = stars[0].right_ascension.decimal
+        catalog['declination'][0] = stars[0].declination.decimal
+        catalog['apparent_magnitude'][0] = stars[0].apparent_magnitude
+        catalog['stellar_class'][0] = b'O9V'
+
+        image1 = render_handler.render_stars(stars[:1], self.observer, width=90, height=60)
+        image2 = render_handler.render_catalog(catalog, self.observer, width=90, height=60)
+
+        self.assertTrue((image1 == image2).all())
+        self.assertEqual(image1[30, 45].tolist(), list(render_handler.hex_to_rgb(stars[0].get_star_color())))
+
+    def test_encoding(self):
+        image = render_handler.create_image(3, 2, background=(1, 2, 3))
+
+        self.assertEqual(render_handler.encode_ppm(image), b'P6\n3 2\n255\n' + bytes([1, 2, 3] * 6))
+        self.assertTrue(render_handler.encode_png(image).startswith(b'\x89PNG\r\n\x1a\n'))
+
 
 if __name__ == '__main__':
     unittest.main()